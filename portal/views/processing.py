@@ -16,6 +16,12 @@ import urllib.parse
 from flask import session
 from typing import Dict, List
 from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib parser
+    orjson = None
 
 # Define BASE_DIR at the module level
 BASE_DIR = Path(__file__).resolve().parents[2]  # Assumes views/processing.py is two levels down from project root
@@ -23,6 +29,9 @@ BASE_DIR = Path(__file__).resolve().parents[2]  # Assumes views/processing.py is
 # Database path - filemaker.db is in the root directory, not in data/
 FILEMAKER_DB = BASE_DIR / "filemaker.db"
 
+# Failed-bills summary written by the preprocessing step
+FAILED_SUMMARY_PATH = BASE_DIR / "data" / "dashboard" / "failed_summary.json"
+
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -45,6 +54,18 @@ except Exception as e:
 
 S3_BUCKET = os.getenv('S3_BUCKET')
 
+@lru_cache(maxsize=1)
+def _load_summary(mtime):
+    """Parse failed_summary.json; keyed on its mtime so a rewrite invalidates the cache."""
+    with open(FAILED_SUMMARY_PATH, "rb") as f:
+        if orjson is not None:
+            return orjson.loads(f.read())
+        return json.load(f)
+
+def load_failed_summary():
+    """Return the parsed failed summary, re-reading the file only when it changes."""
+    return _load_summary(os.path.getmtime(FAILED_SUMMARY_PATH))
+
 def get_s3_json(key):
     """Get JSON data from S3."""
     try:
@@ -101,11 +122,8 @@ def processing():
 @processing_bp.route('/summary')
 def summary_dashboard():
     """Render the summary dashboard page."""
-    json_path = BASE_DIR / "data" / "dashboard" / "failed_summary.json"
-    
     try:
-        with open(json_path, "r") as f:
-            summary_data = json.load(f)
+        summary_data = load_failed_summary()
     except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Error loading summary data: {str(e)}")
         summary_data = []
@@ -115,11 +133,8 @@ def summary_dashboard():
 @processing_bp.route('/fails')
 def list_fail_files():
     """List all files that failed processing validation."""
-    json_path = BASE_DIR / "data" / "dashboard" / "failed_summary.json"
-    
     try:
-        with open(json_path, "r") as f:
-            all_files = json.load(f)
+        all_files = load_failed_summary()
     except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Error loading summary data: {str(e)}")
         all_files = []
@@ -913,10 +928,8 @@ def view_fail_file(filename):
         json_data = get_s3_json(key)
         
         # Get list of all failed files for navigation
-        json_path = BASE_DIR / "data" / "dashboard" / "failed_summary.json"
         try:
-            with open(json_path, "r") as f:
-                all_files = json.load(f)
+            all_files = load_failed_summary()
         except (FileNotFoundError, json.JSONDecodeError):
             all_files = []
         
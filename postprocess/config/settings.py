@@ -1,23 +1,24 @@
-import os
 from pathlib import Path
 
 # Base paths
-BASE_PATH = r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\EOBR"
-INPUT_JSON_PATH = r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\validation logs\validation_passes_20250323_171406.json"
-JSON_DIR_PATH = r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\scripts\VAILIDATION\data\extracts\valid\mapped\staging\success"
-DB_PATH = r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\reference_tables\orders2.db"
-WORD_TEMPLATE = os.path.join(BASE_PATH, "EOBR Template.docx")
-HISTORICAL_EXCEL_PATH = os.path.join(BASE_PATH, "Historical_EOBR_Data.xlsx")
+BASE_PATH = Path(r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\EOBR")
+INPUT_JSON_PATH = Path(r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\validation logs\validation_passes_20250323_171406.json")
+JSON_DIR_PATH = Path(r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\scripts\VAILIDATION\data\extracts\valid\mapped\staging\success")
+DB_PATH = Path(r"C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Documents\Bill_Review_INTERNAL\reference_tables\orders2.db")
+WORD_TEMPLATE = BASE_PATH / "EOBR Template.docx"
+HISTORICAL_EXCEL_PATH = BASE_PATH / "Historical_EOBR_Data.xlsx"
+HISTORICAL_INDEX_PATH = BASE_PATH / "Historical_EOBR_Data.index.db"
+HISTORICAL_PARQUET_DIR = BASE_PATH / "Historical_EOBR_Data"
 
 # Excel headers
-EXCEL_HEADERS = [
+EXCEL_HEADERS = (
     "Release Payment", "Duplicate Check", "Full Duplicate Key", "Input File", "EOBR Number", "Vendor",
     "Mailing Address", "Terms", "Bill Date", "Due Date", "Category", "Description", "Amount", "Memo", "Total"
-]
+)
 
 # Acceptable values
-ACCEPTABLE_MODIFIERS = {"26", "25", "TC", "RT", "LT", "59"}
-ACCEPTABLE_POS = {"49", "11"}
+ACCEPTABLE_MODIFIERS = frozenset({"26", "25", "TC", "RT", "LT", "59"})
+ACCEPTABLE_POS = frozenset({"49", "11"})
 
 # Business rules
 DEFAULT_TERMS = "Net 45"
@@ -1,29 +1,93 @@
-import pandas as pd
 from datetime import datetime
+import os
+import queue
 import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # save_to_parquet() is unavailable
+    pa = pq = None
+
+PARQUET_AVAILABLE = pq is not None
+
+# DB interaction logging is off unless CDX_DB_LOG=1 is set
+DB_LOG_ENABLED = os.environ.get("CDX_DB_LOG", "0") == "1"
+DRAIN_BATCH = 1000  # most records the drain thread formats per wake-up
+
+def _noop_log(function, action, params, result):
+    pass
 
 class DBLogger:
-    def __init__(self):
+    def __init__(self, enabled=DB_LOG_ENABLED):
+        self.enabled = enabled
         self.logs = []
-        self.lock = threading.Lock()
+        self.q = queue.SimpleQueue()
+        if not enabled:
+            # Shadow log() so disabled call sites cost a single no-op call
+            self.log = _noop_log
+            return
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
 
     def log(self, function, action, params, result):
-        with self.lock:
-            self.logs.append({
-                "timestamp": datetime.now().isoformat(),
-                "function": function,
-                "action": action,
-                "params": str(params),
-                "result": str(result)
-            })
+        # Only capture the raw values here; formatting happens on the drain thread
+        self.q.put_nowait((time.time(), function, action, params, result))
+
+    def _drain(self):
+        """Pop queued records in batches, format them and append to the in-memory log"""
+        while True:
+            items = [self.q.get()]
+            # Take whatever else is already queued without blocking
+            try:
+                while len(items) < DRAIN_BATCH:
+                    items.append(self.q.get_nowait())
+            except queue.Empty:
+                pass
+            
+            batch = []
+            for item in items:
+                if isinstance(item, threading.Event):
+                    # Everything queued before the flush marker is in batch
+                    self.logs.extend(batch)
+                    batch = []
+                    item.set()
+                    continue
+                ts, function, action, params, result = item
+                batch.append({
+                    "timestamp": datetime.fromtimestamp(ts).isoformat(),
+                    "function": function,
+                    "action": action,
+                    "params": str(params),
+                    "result": str(result)
+                })
+            self.logs.extend(batch)
+
+    def flush(self):
+        """Block until every record queued so far has been drained"""
+        if not self.enabled:
+            return
+        done = threading.Event()
+        self.q.put_nowait(done)
+        done.wait()
 
     def save_to_excel(self, path):
-        with self.lock:
-            if not self.logs:
-                return
-            df = pd.DataFrame(self.logs)
-            df.to_excel(path, index=False)
+        self.flush()
+        if not self.logs:
+            return
+        # pandas is only needed here; importing it lazily keeps it off the startup path
+        import pandas as pd
+        df = pd.DataFrame(self.logs)
+        df.to_excel(path, index=False)
+
+    def save_to_parquet(self, path):
+        """Write the log as a parquet file (needs pyarrow)"""
+        self.flush()
+        if not self.logs:
+            return
+        pq.write_table(pa.Table.from_pylist(self.logs), path)
 
 # Create a global logger instance
 
-db_logger = DBLogger() 
\ No newline at end of file
+db_logger = DBLogger()
@@ -1,10 +1,22 @@
+import atexit
+import json
+import shlex
+import shutil
 import sqlite3
 import os
 import logging
 from pathlib import Path
 import tempfile
+from collections import Counter
+from contextlib import contextmanager
 import paramiko
 from datetime import datetime
+
+try:
+    # libssh2-backed client; does the transfer crypto in C when installed
+    from pssh.clients import SSHClient as PsshClient
+except ImportError:  # fall back to paramiko's SFTP
+    PsshClient = None
 from data.db_logger import db_logger
 
 # Remote database settings
@@ -13,89 +25,504 @@ REMOTE_USER = "root"
 REMOTE_DB_PATH = "/srv/bill_review/filemaker.db"
 REMOTE_KEY_PATH = os.path.expanduser("~/.ssh/id_rsa")  # Path to your SSH key
 USE_REMOTE_DB = True  # Toggle to use remote or local database
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "filemaker.db")
+SFTP_MAX_REQUESTS = 64  # Outstanding SFTP read requests while downloading the DB
+# Hold the downloaded remote database in memory rather than in the temp file
+# so queries never touch the disk (uploads snapshot it back to a file; if the
+# last upload fails, close_db() saves it to UNPUSHED_DB_DIR)
+DB_IN_MEMORY = os.environ.get("CDX_DB_IN_MEMORY", "1") == "1"
+SFTP_WINDOW_SIZE = 2 * 1024 * 1024  # SSH channel window for the SFTP channel
+SFTP_MAX_PACKET = 256 * 1024  # Largest SSH packet on the SFTP channel
+# Answer single-row lookups/updates with the server's sqlite3 CLI (3.33+ for
+# JSON output) instead of downloading the whole database first
+USE_REMOTE_SQL = os.environ.get("CDX_REMOTE_SQL", "0") == "1"
+# Transfer the database with parallel-ssh (libssh2) instead of paramiko's
+# SFTP. Only with CDX_PSSH=1, so installing the package changes nothing
+USE_PSSH = os.environ.get("CDX_PSSH", "0") == "1" and PsshClient is not None
+SSH_KEEPALIVE = 30  # seconds between keepalives on the reused SSH session
+DB_PATH = Path(__file__).resolve().parents[2] / "filemaker.db"
+# Where close_db() saves the database when pushing it to the server fails,
+# so the payments recorded in the run can still be uploaded by hand
+UNPUSHED_DB_DIR = DB_PATH.parent
+# Where remote DB copies are staged - prefer a RAM-backed directory so the
+# download and the SQLite reads that follow never touch the disk
+DB_TEMP_DIR = os.environ.get("CDX_DB_TEMP_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+# Indexes backing the per-item lookups, created by initialize_database().
+# (id, Order_ID) serves the WHERE clause of both check_if_item_paid and
+# update_payment_info; trailing BR_paid makes the paid check index-only.
+# Order_ID alone drives the BILLS_PAID reads/increment and list_line_items.
+DB_INDEXES = {
+    "ix_line_items_id_order": "CREATE INDEX IF NOT EXISTS ix_line_items_id_order ON line_items(id, Order_ID, BR_paid)",
+    "ix_line_items_order_id": "CREATE INDEX IF NOT EXISTS ix_line_items_order_id ON line_items(Order_ID, id)",
+    "ix_orders_order_id": "CREATE INDEX IF NOT EXISTS ix_orders_order_id ON orders(Order_ID)",
+}
+
+# Applied to every new writable connection. The journal mode is left alone:
+# WAL would persist in the file, and the copy uploaded to the server must be
+# a self-contained rollback-journal database (its -wal/-shm files never
+# travel with it). synchronous=NORMAL drops the per-commit fsync of the
+# rollback journal.
+DB_PRAGMAS = (
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-64000",
+    "mmap_size=268435456",
+    "busy_timeout=5000",
+)
+
+# SQL used by the helpers below. Keeping each statement as a single module
+# constant means every call sends identical text, so sqlite3's per-connection
+# statement cache reuses the compiled statement instead of re-preparing it.
+SQL_STATEMENT_CACHE = 128
+
+_SQL_BILLS_PAID = 'SELECT BILLS_PAID FROM orders WHERE Order_ID = ?'
+_SQL_INCREMENT_BILLS_PAID = 'UPDATE orders SET BILLS_PAID = COALESCE(CAST(BILLS_PAID AS INTEGER), 0) + 1 WHERE Order_ID = ?'
+# Remote counterpart of _bump_bills_paid() for a script that can't branch on
+# the line-item UPDATE's row count: it only matches when the line item exists
+_SQL_INCREMENT_BILLS_PAID_FOR_ITEM = (
+    'UPDATE orders SET BILLS_PAID = COALESCE(CAST(BILLS_PAID AS INTEGER), 0) + 1 WHERE Order_ID = ? '
+    'AND EXISTS (SELECT 1 FROM line_items WHERE id = ? AND Order_ID = ?)'
+)
+_SQL_ADD_BILLS_PAID = 'UPDATE orders SET BILLS_PAID = COALESCE(CAST(BILLS_PAID AS INTEGER), 0) + ? WHERE Order_ID = ?'
+_SQL_CHECK_PAID = "SELECT BR_paid FROM line_items WHERE id = ? AND Order_ID = ? AND BR_paid IS NOT NULL AND BR_paid != 'None' AND BR_paid != ''"
+_SQL_CHECK_PAID_BULK = (
+    "SELECT id, Order_ID FROM line_items WHERE BR_paid IS NOT NULL AND BR_paid != 'None' AND BR_paid != '' "
+    "AND (id, Order_ID) IN (VALUES {values})"
+)
+_SQL_EXISTING_ITEMS = "SELECT id, Order_ID FROM line_items WHERE (id, Order_ID) IN (VALUES {values})"
+_PAID_BULK_CHUNK = 400  # pairs per query - keeps bound parameters under SQLite's 999 limit
+_SQL_LIST_ITEMS = 'SELECT id, Order_ID, CPT, BR_paid, BR_rate, EOBR_doc_no FROM line_items WHERE Order_ID = ?'
+_SQL_LIST_ITEMS_SAMPLE = 'SELECT id, Order_ID, CPT, BR_paid, BR_rate, EOBR_doc_no FROM line_items LIMIT 10'
+_SQL_UPDATE_PAYMENT = '''
+        UPDATE line_items SET 
+            BR_paid = ?,
+            BR_rate = ?,
+            EOBR_doc_no = ?,
+            HCFA_doc_no = ?,
+            BR_date_processed = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND Order_ID = ?
+        '''
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """Get database connection (local or remote)"""
-    if USE_REMOTE_DB:
-        return get_remote_db_connection()
+# Process-wide database state. The database is opened (and, in remote mode,
+# downloaded) once on first use and kept until close_db(); writes only mark
+# the copy dirty and reach the server through flush_db_to_remote().
+_CONN = None        # writable connection
+_READ_CONN = None   # query_only connection on the same file for readers
+_DB_PATH = None     # file the connections are open on (temp copy in remote mode, None in memory)
+_DIRTY = False      # local copy has committed changes the remote doesn't have
+_REMOTE_STAT = None # server file's "mtime:size" when downloaded/last pushed; uploads check it
+_SSH = None         # SSH session shared by every transfer and remote query
+_SFTP = None        # SFTP channel on _SSH
+_PSSH = None        # parallel-ssh client for file transfers, when available
+_BATCH_DEPTH = 0    # open db_batch() blocks; helpers leave committing to the outermost one
+_PENDING = []       # (sql, params) writes in the open transaction
+_CHANGELOG = []     # committed writes not yet applied to the remote
+
+def get_db_connection(read_only=False):
+    """
+    Get the process-wide database connection (local or remote), opening it on first use
+    
+    Args:
+        read_only (bool): Return the query_only connection meant for readers
+        
+    Returns:
+        sqlite3.Connection or None: The cached connection, None if the database can't be opened
+    """
+    global _CONN, _READ_CONN, _DB_PATH, _DIRTY
+    if _CONN is None:
+        # A fresh copy; anything left unpushed by the last one was saved by close_db()
+        _DIRTY = False
+        if USE_REMOTE_DB:
+            _CONN, _DB_PATH = get_remote_db_connection()
+        else:
+            _CONN, _DB_PATH = get_local_db_connection()
+        if _CONN is None:
+            return None
+        _configure(_CONN)
+    
+    # An in-memory database is only reachable through its own connection
+    if not read_only or _DB_PATH is None:
+        return _CONN
+    
+    if _READ_CONN is None:
+        try:
+            _READ_CONN = connect_read_only(_DB_PATH)
+        except Exception as e:
+            logger.error(f"Error opening read-only connection, using the writable one: {e}")
+            return _CONN
+    return _READ_CONN
+
+def _cleanup(db_path):
+    """Remove a temp copy of the remote database (never the local DB_PATH)"""
+    if USE_REMOTE_DB and db_path and Path(db_path) != DB_PATH:
+        Path(db_path).unlink(missing_ok=True)
+
+def mark_dirty():
+    """Record that the local copy has changes that still need pushing to the remote"""
+    global _DIRTY
+    _DIRTY = True
+
+def _execute_write(cursor, sql, params=()):
+    """
+    Execute a write and note it for the remote changelog
+    
+    Returns:
+        int: cursor.rowcount
+    """
+    cursor.execute(sql, params)
+    if cursor.rowcount:
+        _PENDING.append((sql, tuple(params)))
+    return cursor.rowcount
+
+def _execute_many_write(cursor, sql, seq_of_params):
+    """
+    executemany() counterpart of _execute_write(); every parameter row is
+    noted for the remote changelog, so only pass rows that match
+    
+    Returns:
+        int: cursor.rowcount (total over all parameter rows)
+    """
+    seq_of_params = [tuple(params) for params in seq_of_params]
+    if not seq_of_params:
+        return 0
+    cursor.executemany(sql, seq_of_params)
+    _PENDING.extend((sql, params) for params in seq_of_params)
+    return cursor.rowcount
+
+def _commit(conn):
+    """Commit unless a db_batch() owns the transaction"""
+    if not _BATCH_DEPTH:
+        conn.commit()
+        _CHANGELOG.extend(_PENDING)
+        _PENDING.clear()
+        forget_cached_reads()
+
+def _rollback(conn):
+    """Roll back unless a db_batch() owns the transaction (it rolls back on error itself)"""
+    if not _BATCH_DEPTH:
+        conn.rollback()
+        _PENDING.clear()
+        forget_cached_reads()
+
+def _push_changelog():
+    """
+    Replay the committed writes on the remote database in one transaction
+    
+    Returns:
+        bool: True if the server applied them
+    """
+    script = ";\n".join(_bind(sql, params) for sql, params in _CHANGELOG)
+    try:
+        _run_remote_sql(f"BEGIN;\n{script};\nCOMMIT;")
+    except Exception as e:
+        logger.error(f"Error replaying changes on remote database: {e}")
+        return False
+    logger.info(f"Applied {len(_CHANGELOG)} change(s) to remote database")
+    return True
+
+def flush_db_to_remote():
+    """
+    Upload the local database copy if it has changed since the last upload
+    
+    Returns:
+        bool: True if the remote is up to date, False if the upload failed
+    """
+    global _DIRTY, _REMOTE_STAT
+    if not USE_REMOTE_DB or not _DIRTY or _CONN is None:
+        return True
+    
+    # With sqlite3 available on the server, send only the statements that
+    # changed rows instead of the whole file (falling back to the upload)
+    if USE_REMOTE_SQL and _CHANGELOG and _push_changelog():
+        _CHANGELOG.clear()
+        _DIRTY = False
+        # The server's file now matches this copy again
+        if _REMOTE_STAT is not None:
+            _REMOTE_STAT = _remote_db_stat()
+        return True
+    
+    _CONN.commit()
+    if _DB_PATH is None:
+        pushed = _push_memory_db()
     else:
-        return get_local_db_connection()
+        # A copy that arrived in WAL mode is checkpointed and switched back,
+        # so the uploaded file holds every change on its own. That needs the
+        # only connection to the file; readers reopen theirs on next use.
+        _close_read_conn()
+        _CONN.execute("PRAGMA journal_mode=DELETE")
+        pushed = push_db_changes_to_remote(_DB_PATH)
+    if pushed:
+        _CHANGELOG.clear()
+        _DIRTY = False
+        return True
+    return False
+
+def _push_memory_db():
+    """Snapshot the in-memory database to a temp file and upload that"""
+    temp_db = tempfile.NamedTemporaryFile(delete=False, dir=DB_TEMP_DIR, suffix=".db")
+    temp_db.close()
+    try:
+        dest = sqlite3.connect(temp_db.name)
+        try:
+            _CONN.backup(dest)
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+        return push_db_changes_to_remote(temp_db.name)
+    except Exception as e:
+        logger.error(f"Error snapshotting in-memory database: {e}")
+        return False
+    finally:
+        _cleanup(temp_db.name)
+
+def _close_read_conn():
+    """Close the query_only connection; get_db_connection(read_only=True) reopens it"""
+    global _READ_CONN
+    if _READ_CONN is not None:
+        _READ_CONN.close()
+        _READ_CONN = None
+
+def _save_unpushed_copy():
+    """
+    Save the database flush_db_to_remote() couldn't push to UNPUSHED_DB_DIR
+    
+    Returns:
+        str or None: Path of the saved copy, None if saving it failed too
+    """
+    path = UNPUSHED_DB_DIR / f"filemaker.unpushed.{datetime.now().strftime('%Y%m%d%H%M%S')}.db"
+    try:
+        dest = sqlite3.connect(path)
+        try:
+            _CONN.backup(dest)
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+    except Exception as e:
+        logger.critical(f"Remote database NOT updated and the local copy could not be saved ({e}); this run's payment updates are lost")
+        return None
+    logger.error(
+        f"Remote database NOT updated; this run's payment updates are saved in {path}. "
+        f"Check {REMOTE_HOST}:{REMOTE_DB_PATH} for changes made since the run started, then upload it in its place"
+    )
+    return os.fspath(path)
+
+def close_db():
+    """
+    Push pending changes, close the cached connections and remove the temp copy
+    
+    If the push fails the database is saved to UNPUSHED_DB_DIR first (see
+    _save_unpushed_copy()) and _DIRTY stays set.
+    """
+    global _CONN, _READ_CONN, _DB_PATH, _SSH, _SFTP, _PSSH, _REMOTE_STAT
+    if _CONN is not None:
+        if not flush_db_to_remote():
+            _save_unpushed_copy()
+        _close_read_conn()
+        _CONN.close()
+        
+        _cleanup(_DB_PATH)
+        _CONN = _READ_CONN = _DB_PATH = _REMOTE_STAT = None
+    forget_cached_reads()
+    
+    if _SFTP is not None:
+        _SFTP.close()
+        _SFTP = None
+    if _PSSH is not None:
+        _PSSH.disconnect()
+        _PSSH = None
+    if _SSH is not None:
+        _SSH.close()
+        _SSH = None
+
+atexit.register(close_db)
+
+def _configure(conn):
+    """Apply DB_PRAGMAS to a freshly opened connection"""
+    for pragma in DB_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+
+def connect_read_only(db_path, immutable=False):
+    """
+    Open a read-only SQLite connection via a URI
+    
+    Args:
+        db_path (str): Path to the database file
+        immutable (bool): Tell SQLite the file can't change (only safe for private copies)
+        
+    Returns:
+        sqlite3.Connection: The read-only connection
+    """
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=SQL_STATEMENT_CACHE)
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
 
 def get_local_db_connection():
     """Get a connection to the local database"""
-    if not Path(DB_PATH).exists():
+    if not DB_PATH.exists():
         logger.error(f"Error: Database file not found at {DB_PATH}")
         return None, None
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        return conn, DB_PATH
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=SQL_STATEMENT_CACHE)
+        return conn, os.fspath(DB_PATH)
     except Exception as e:
         logger.error(f"Error connecting to local database: {e}")
         return None, None
 
+def _get_ssh():
+    """Return the shared SSH session, (re)connecting it if needed"""
+    global _SSH, _SFTP
+    transport = _SSH.get_transport() if _SSH is not None else None
+    if transport is None or not transport.is_active():
+        if _SSH is not None:
+            _SSH.close()
+        _SFTP = None
+        _SSH = paramiko.SSHClient()
+        _SSH.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        _SSH.connect(REMOTE_HOST, username=REMOTE_USER, key_filename=REMOTE_KEY_PATH)
+        _SSH.get_transport().set_keepalive(SSH_KEEPALIVE)
+    return _SSH
+
+def _get_sftp():
+    """Return the shared SFTP channel, reopening it (and the SSH session) if needed"""
+    global _SFTP
+    ssh = _get_ssh()
+    if _SFTP is None or _SFTP.get_channel().closed:
+        # A wider window/bigger packets than open_sftp()'s defaults keep more
+        # of the database in flight on high-latency links
+        _SFTP = paramiko.SFTPClient.from_transport(
+            ssh.get_transport(), window_size=SFTP_WINDOW_SIZE, max_packet_size=SFTP_MAX_PACKET
+        )
+    return _SFTP
+
+def _get_pssh():
+    """Return the shared parallel-ssh client (only called when USE_PSSH is set)"""
+    global _PSSH
+    if _PSSH is None:
+        _PSSH = PsshClient(REMOTE_HOST, user=REMOTE_USER, pkey=REMOTE_KEY_PATH, keepalive_seconds=SSH_KEEPALIVE)
+    return _PSSH
+
+def _remote_db_stat():
+    """
+    The server database's "mtime:size"
+    
+    Returns:
+        str or None: The stat, None (with uploads left unchecked) if it can't be read
+    """
+    try:
+        stdin, stdout, stderr = _get_ssh().exec_command(f"stat -c %Y:%s {shlex.quote(REMOTE_DB_PATH)}")
+        stdin.channel.shutdown_write()
+        output = stdout.read().decode().strip()
+        if stdout.channel.recv_exit_status() != 0:
+            raise RuntimeError(stderr.read().decode(errors="replace").strip())
+        return output
+    except Exception as e:
+        logger.warning(f"Could not stat remote database, uploads won't check it for changes: {e}")
+        return None
+
 def get_remote_db_connection():
-    """Create an SSH tunnel and connect to the remote database"""
+    """Download the remote database to a temp file and connect to the copy"""
+    global _REMOTE_STAT
     try:
+        # Taken before the download, so a change made while it runs also
+        # stops the upload from replacing the server's file
+        _REMOTE_STAT = _remote_db_stat()
+        
         # Create a temporary file to hold the database
-        temp_db = tempfile.NamedTemporaryFile(delete=False)
-        temp_db.close()
+        temp_db = tempfile.NamedTemporaryFile(delete=False, dir=DB_TEMP_DIR)
         
-        # Setup SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        if USE_PSSH:
+            temp_db.close()
+            _get_pssh().copy_remote_file(REMOTE_DB_PATH, temp_db.name)
+        else:
+            # Connect to the remote server
+            try:
+                sftp = _get_sftp()
+            except Exception as e:
+                logger.error(f"SSH connection error: {e}")
+                temp_db.close()
+                _cleanup(temp_db.name)
+                return None, None
+            
+            # Stream the remote database straight into the open temp file,
+            # reserving its full size up front so the file isn't grown piecemeal
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(temp_db.fileno(), 0, sftp.stat(REMOTE_DB_PATH).st_size)
+            sftp.getfo(REMOTE_DB_PATH, temp_db, max_concurrent_prefetch_requests=SFTP_MAX_REQUESTS)
+            temp_db.close()
         
-        # Connect to the remote server
+        if not DB_IN_MEMORY:
+            # Connect to the copied database
+            conn = sqlite3.connect(temp_db.name, check_same_thread=False, cached_statements=SQL_STATEMENT_CACHE)
+            logger.info(f"Downloaded remote database to {temp_db.name}")
+            return conn, temp_db.name
+        
+        # Copy it page by page into an in-memory database and drop the file
+        conn = sqlite3.connect(":memory:", check_same_thread=False, cached_statements=SQL_STATEMENT_CACHE)
+        source = sqlite3.connect(temp_db.name)
         try:
-            ssh.connect(REMOTE_HOST, username=REMOTE_USER, key_filename=REMOTE_KEY_PATH)
-        except Exception as e:
-            logger.error(f"SSH connection error: {e}")
-            if os.path.exists(temp_db.name):
-                os.unlink(temp_db.name)
-            return None, None
-        
-        # Copy the remote database file to local temp file
-        sftp = ssh.open_sftp()
-        sftp.get(REMOTE_DB_PATH, temp_db.name)
-        sftp.close()
-        ssh.close()
-        
-        # Connect to the copied database
-        conn = sqlite3.connect(temp_db.name)
-        return conn, temp_db.name
+            source.backup(conn)
+        finally:
+            source.close()
+        _cleanup(temp_db.name)
+        logger.info("Loaded remote database into memory")
+        return conn, None
     except Exception as e:
         logger.error(f"Error connecting to remote database: {e}")
         # Clean up if possible
-        if 'temp_db' in locals() and os.path.exists(temp_db.name):
-            os.unlink(temp_db.name)
+        if 'temp_db' in locals():
+            temp_db.close()
+            _cleanup(temp_db.name)
         return None, None
 
 def push_db_changes_to_remote(temp_db_path):
-    """Push the updated database back to the remote server"""
+    """
+    Push the updated database back to the remote server
+    
+    The upload replaces the server's whole file, so it is refused if that
+    file has changed (e.g. the portal committed to it) since it was
+    downloaded or last pushed; see _REMOTE_STAT.
+    """
+    global _REMOTE_STAT
     try:
-        # Setup SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # Connect to the remote server
-        ssh.connect(REMOTE_HOST, username=REMOTE_USER, key_filename=REMOTE_KEY_PATH)
-        
-        # Copy the local temp file back to the remote server
-        sftp = ssh.open_sftp()
-        
-        # Create a backup of remote database first
+        # One remote command: stream the file next to the live database (which
+        # stays in place while the transfer runs), check the live database is
+        # still the one downloaded, keep it as a backup, then swap the upload in
         backup_name = f"{REMOTE_DB_PATH}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        sftp.rename(REMOTE_DB_PATH, backup_name)
-        
-        # Upload the updated database
-        sftp.put(temp_db_path, REMOTE_DB_PATH)
-        sftp.close()
-        ssh.close()
+        staged_path = f"{REMOTE_DB_PATH}.new"
+        live, staged, backup = (shlex.quote(p) for p in (REMOTE_DB_PATH, staged_path, backup_name))
+        swap = f"mv -f {live} {backup} && mv -f {staged} {live} && stat -c %Y:%s {live}"
+        if _REMOTE_STAT is not None:
+            swap = (
+                f'{{ [ "$(stat -c %Y:%s {live})" = {shlex.quote(_REMOTE_STAT)} ] || '
+                f'{{ rm -f {staged}; echo "remote database changed since it was downloaded" >&2; exit 3; }}; }} && {swap}'
+            )
+        if USE_PSSH:
+            # libssh2 does the bulk transfer; the swap is still one command
+            _get_pssh().copy_file(temp_db_path, staged_path)
+            stdin, stdout, stderr = _get_ssh().exec_command(swap)
+        else:
+            stdin, stdout, stderr = _get_ssh().exec_command(f"cat > {staged} && {swap}")
+            with open(temp_db_path, "rb") as f:
+                shutil.copyfileobj(f, stdin, length=1 << 20)
+        stdin.channel.shutdown_write()
+        output = stdout.read().decode().strip()
+        if stdout.channel.recv_exit_status() != 0:
+            raise RuntimeError(stderr.read().decode(errors="replace").strip())
+        if _REMOTE_STAT is not None:
+            _REMOTE_STAT = output
         
         logger.info(f"Successfully updated remote database (backup created at {backup_name})")
         return True
@@ -103,9 +530,113 @@ def push_db_changes_to_remote(temp_db_path):
         logger.error(f"Error pushing database changes to remote: {e}")
         return False
 
+def _sql_literal(value):
+    """Render a Python value as an SQLite literal"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _bind(sql, params):
+    """Substitute ? placeholders with quoted literals for the sqlite3 CLI"""
+    parts = sql.split("?")
+    if len(parts) - 1 != len(params):
+        raise ValueError(f"Expected {len(parts) - 1} parameters, got {len(params)}")
+    bound = [parts[0]]
+    for value, part in zip(params, parts[1:]):
+        bound.append(_sql_literal(value))
+        bound.append(part)
+    return "".join(bound)
+
+def _run_remote_sql(script):
+    """Run an SQL script with sqlite3 on the server and return the JSON rows as tuples"""
+    stdin, stdout, stderr = _get_ssh().exec_command(f"sqlite3 -bail {shlex.quote(REMOTE_DB_PATH)}")
+    stdin.write(".mode json\n" + script + "\n")
+    stdin.channel.shutdown_write()
+    output = stdout.read()
+    if stdout.channel.recv_exit_status() != 0:
+        raise RuntimeError(f"Remote sqlite3 failed: {stderr.read().decode(errors='replace').strip()}")
+    if not output.strip():
+        return []
+    return [tuple(row.values()) for row in json.loads(output)]
+
+def remote_query(sql, params=()):
+    """
+    Run a SELECT against the remote database without downloading it
+    
+    Args:
+        sql (str): A single statement using ? placeholders
+        params (tuple): Values for the placeholders
+        
+    Returns:
+        list: Result rows as tuples, like cursor.fetchall()
+    """
+    return _run_remote_sql(_bind(sql, params) + ";")
+
+def remote_exec(sql, params=()):
+    """
+    Run a write statement against the remote database without downloading it
+    
+    Returns:
+        int: Number of rows changed, like cursor.rowcount
+    """
+    rows = _run_remote_sql(_bind(sql, params) + ";\nSELECT changes();")
+    return rows[0][0] if rows else 0
+
+def _remote_sql_active():
+    """True when queries should go to the server - never once a local copy is open"""
+    return USE_REMOTE_DB and USE_REMOTE_SQL and _CONN is None
+
+def _fetch_rows(sql, params):
+    """
+    Run a read query remotely or on the read connection
+    
+    Returns:
+        list or None: The result rows, None if the database can't be opened
+    """
+    if _remote_sql_active():
+        return remote_query(sql, params)
+    conn = get_db_connection(read_only=True)
+    if not conn:
+        return None
+    return conn.execute(sql, params).fetchall()
+
+def ensure_indexes(cursor):
+    """
+    Create any missing indexes from DB_INDEXES
+    
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable connection
+        
+    Returns:
+        list: Names of the indexes that had to be created
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    
+    created = []
+    for name, sql in DB_INDEXES.items():
+        if name not in existing:
+            _execute_write(cursor, sql)
+            created.append(name)
+    
+    # Refresh planner statistics so the new indexes are actually chosen
+    if created:
+        _execute_write(cursor, "ANALYZE")
+    return created
+
 def initialize_database():
     """Initialize SQLite database connection"""
-    conn, db_path = get_db_connection()
+    if _remote_sql_active():
+        # Checked and indexed on the server; nothing is downloaded
+        return _initialize_remote_database()
+    
+    conn = get_db_connection()
     if not conn:
         return False
     
@@ -115,28 +646,37 @@ def initialize_database():
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='line_items'")
         if not cursor.fetchone():
             logger.warning("Warning: line_items table not found in database")
-            conn.close()
-            
-            # Clean up temp file if using remote
-            if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-                os.unlink(db_path)
-                
             return False
             
-        conn.close()
+        created = ensure_indexes(cursor)
+        _commit(conn)
         
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
+        if created:
+            logger.info(f"Created database indexes: {', '.join(created)}")
+            # Indexes only persist remotely once the copy is pushed back
+            mark_dirty()
             
         return True
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
+        return False
+
+def _initialize_remote_database():
+    """initialize_database() executed on the server through the sqlite3 CLI"""
+    try:
+        names = {row[0] for row in remote_query("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+        if "line_items" not in names:
+            logger.warning("Warning: line_items table not found in database")
+            return False
         
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
+        created = [name for name in DB_INDEXES if name not in names]
+        if created:
+            statements = [DB_INDEXES[name] for name in created] + ["ANALYZE"]
+            _run_remote_sql("BEGIN;\n" + ";\n".join(statements) + ";\nCOMMIT;")
+            logger.info(f"Created database indexes: {', '.join(created)}")
+        return True
+    except Exception as e:
+        logger.error(f"Error connecting to database: {e}")
         return False
 
 def check_if_order_has_payments(order_id):
@@ -149,61 +689,19 @@ def check_if_order_has_payments(order_id):
     Returns:
         bool: True if any payments exist, False otherwise
     """
-    if not order_id:
-        return False
+    return get_bills_paid_count(order_id) > 0
+
+def _bump_bills_paid(cursor, order_id):
+    """
+    Increment BILLS_PAID for an order using an existing cursor (no commit)
     
-    conn, db_path = get_db_connection()
-    if not conn:
-        return False
+    BILLS_PAID may be NULL or stored as text, so it's cast (NULL counting
+    as 0) inside the UPDATE itself.
     
-    try:
-        cursor = conn.cursor()
-        
-        # Check BILLS_PAID field in orders table
-        cursor.execute(
-            'SELECT BILLS_PAID FROM orders WHERE Order_ID = ?',
-            (order_id,)
-        )
-        
-        result = cursor.fetchone()
-        
-        # If result is None or BILLS_PAID is None, treat as 0
-        bills_paid = result[0] if result and result[0] is not None else 0
-        
-        # Try to convert to int, handle case where it might be stored as string
-        try:
-            bills_paid = int(bills_paid)
-        except (ValueError, TypeError):
-            bills_paid = 0
-        
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
-        db_logger.log(
-            function="check_if_order_has_payments",
-            action="read",
-            params={"order_id": order_id},
-            result=f"bills_paid: {bills_paid}"
-        )
-        
-        return bills_paid > 0
-    except Exception as e:
-        logger.error(f"Error checking if order has payments: {e}")
-        conn.close()
-        
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
-        db_logger.log(
-            function="check_if_order_has_payments",
-            action="read",
-            params={"order_id": order_id},
-            result=f"Exception: {e}"
-        )
-        return False
+    Returns:
+        bool: True if the order exists and was incremented
+    """
+    return _execute_write(cursor, _SQL_INCREMENT_BILLS_PAID, (order_id,)) > 0
 
 def increment_bills_paid(order_id):
     """
@@ -218,78 +716,60 @@ def increment_bills_paid(order_id):
     if not order_id:
         return False
     
-    conn, db_path = get_db_connection()
+    if _remote_sql_active():
+        return _increment_bills_paid_remote(order_id)
+    
+    conn = get_db_connection()
     if not conn:
         return False
     
     try:
         cursor = conn.cursor()
         
-        # First check if the order exists and has a BILLS_PAID field
-        cursor.execute(
-            'SELECT BILLS_PAID FROM orders WHERE Order_ID = ?',
-            (order_id,)
-        )
-        
-        result = cursor.fetchone()
-        
-        if result is None:
+        success = _bump_bills_paid(cursor, order_id)
+        if not success:
             logger.warning(f"Order {order_id} not found in orders table")
-            conn.close()
-            
-            if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-                os.unlink(db_path)
-                
             return False
         
-        # Get current bills_paid value
-        current_value = result[0] if result[0] is not None else 0
-        
-        # Try to convert to int, handle case where it might be stored as string
-        try:
-            current_value = int(current_value)
-        except (ValueError, TypeError):
-            current_value = 0
-        
-        # Increment BILLS_PAID
-        cursor.execute(
-            'UPDATE orders SET BILLS_PAID = ? WHERE Order_ID = ?',
-            (current_value + 1, order_id)
-        )
-        
-        rows_affected = cursor.rowcount
-        conn.commit()
-        
-        success = rows_affected > 0
-        
-        # If using remote DB, push changes back to server
-        if USE_REMOTE_DB and success:
-            conn.close()  # Close before pushing
-            success = push_db_changes_to_remote(db_path)
-            
-            # Clean up temp file
-            if db_path and os.path.exists(db_path) and db_path != DB_PATH:
-                os.unlink(db_path)
-        else:
-            conn.close()
+        _commit(conn)
+        mark_dirty()
             
         db_logger.log(
             function="increment_bills_paid",
             action="update",
-            params={"order_id": order_id, "new_value": current_value + 1},
-            result=f"success: {success}, rows_affected: {rows_affected}"
+            params={"order_id": order_id},
+            result=f"success: {success}"
         )
         
         return success
         
     except Exception as e:
         logger.error(f"Error incrementing BILLS_PAID: {e}")
-        conn.rollback()
-        conn.close()
-        
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
+        _rollback(conn)
+        db_logger.log(
+            function="increment_bills_paid",
+            action="update",
+            params={"order_id": order_id},
+            result=f"Exception: {e}"
+        )
+        return False
+
+def _increment_bills_paid_remote(order_id):
+    """increment_bills_paid() executed on the server through the sqlite3 CLI"""
+    try:
+        rows_affected = remote_exec(_SQL_INCREMENT_BILLS_PAID, (order_id,))
+        forget_cached_reads()
+        if rows_affected == 0:
+            logger.warning(f"Order {order_id} not found in orders table")
+        db_logger.log(
+            function="increment_bills_paid",
+            action="update",
+            params={"order_id": order_id},
+            result=f"success: {rows_affected > 0}"
+        )
+        return rows_affected > 0
+    except Exception as e:
+        logger.error(f"Error incrementing BILLS_PAID: {e}")
         db_logger.log(
             function="increment_bills_paid",
             action="update",
@@ -298,10 +778,16 @@ def increment_bills_paid(order_id):
         )
         return False
 
+# Paid-status results for (line_item_id, order_id) pairs read since the last write
+_item_paid_cache = {}
+
 def check_if_item_paid(line_item_id, order_id):
     """
     Check if a line item has already been paid
     
+    Results are memoized until the next write committed through this module
+    (see forget_cached_reads()) or close_db().
+    
     Args:
         line_item_id (int): The line item ID
         order_id (str): The order ID
@@ -312,48 +798,101 @@ def check_if_item_paid(line_item_id, order_id):
     if not line_item_id or not order_id:
         return False
     
-    conn, db_path = get_db_connection()
-    if not conn:
+    key = (line_item_id, order_id)
+    if key in _item_paid_cache:
+        return _item_paid_cache[key]
+    
+    paid = _check_if_item_paid_uncached(line_item_id, order_id)
+    if paid is None:
+        # Lookup failed - don't remember the failure
         return False
+    _item_paid_cache[key] = paid
+    return paid
+
+check_if_item_paid.cache_clear = _item_paid_cache.clear
+
+def _check_if_item_paid_uncached(line_item_id, order_id):
+    """
+    Query the database for a line item's paid status
     
+    Returns:
+        bool or None: True/False for the paid status, None if the lookup failed
+    """
     try:
-        cursor = conn.cursor()
-        
         # Check if the line item exists and has been paid
-        cursor.execute(
-            'SELECT BR_paid FROM line_items WHERE id = ? AND Order_ID = ? AND BR_paid IS NOT NULL AND BR_paid != "None" AND BR_paid != ""',
-            (line_item_id, order_id)
-        )
+        rows = _fetch_rows(_SQL_CHECK_PAID, (line_item_id, order_id))
+        if rows is None:
+            return None
         
-        result = cursor.fetchone()
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="check_if_item_paid",
             action="read",
             params={"line_item_id": line_item_id, "order_id": order_id},
-            result=result is not None
+            result=bool(rows)
         )
-        return result is not None
+        return bool(rows)
     except Exception as e:
         logger.error(f"Error checking if item paid: {e}")
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="check_if_item_paid",
             action="read",
             params={"line_item_id": line_item_id, "order_id": order_id},
             result=f"Exception: {e}"
         )
-        return False
+        return None
+
+def check_items_paid_bulk(pairs):
+    """
+    Check which of several line items have already been paid, in one pass
+    
+    Results also warm the check_if_item_paid cache, so later single checks for
+    the same pairs don't go back to the database.
+    
+    Args:
+        pairs (iterable): (line_item_id, order_id) tuples
+        
+    Returns:
+        set: The subset of the given pairs that have been paid
+    """
+    pairs = [(lid, oid) for lid, oid in pairs if lid and oid]
+    paid = {pair for pair in pairs if _item_paid_cache.get(pair)}
+    pending = [pair for pair in dict.fromkeys(pairs) if pair not in _item_paid_cache]
+    if not pending:
+        return paid
+    
+    # line_items stores id/Order_ID as TEXT; map results back to the caller's values
+    by_text = {(str(lid), str(oid)): (lid, oid) for lid, oid in pending}
+    
+    try:
+        found = set()
+        for start in range(0, len(pending), _PAID_BULK_CHUNK):
+            chunk = pending[start:start + _PAID_BULK_CHUNK]
+            sql = _SQL_CHECK_PAID_BULK.format(values=",".join(["(?,?)"] * len(chunk)))
+            rows = _fetch_rows(sql, [str(v) for pair in chunk for v in pair])
+            if rows is None:
+                return paid
+            found.update(by_text[(str(row[0]), str(row[1]))] for row in rows)
+        
+        for pair in pending:
+            _item_paid_cache[pair] = pair in found
+        paid |= found
+        
+        db_logger.log(
+            function="check_items_paid_bulk",
+            action="read",
+            params={"pairs": len(pending)},
+            result=f"paid: {len(found)}"
+        )
+        return paid
+    except Exception as e:
+        logger.error(f"Error checking paid line items: {e}")
+        db_logger.log(
+            function="check_items_paid_bulk",
+            action="read",
+            params={"pairs": len(pending)},
+            result=f"Exception: {e}"
+        )
+        return paid
 
 def update_payment_info(line_item_id, order_id, br_paid, br_rate, eobr_doc_no, hcfa_doc_no, br_date_processed):
     """
@@ -374,44 +913,27 @@ def update_payment_info(line_item_id, order_id, br_paid, br_rate, eobr_doc_no, h
     if not line_item_id or not order_id:
         return False
     
-    conn, db_path = get_db_connection()
-    if not conn:
-        return False
+    params = (br_paid, br_rate, eobr_doc_no, hcfa_doc_no, br_date_processed, line_item_id, order_id)
+    conn = None
+    if not _remote_sql_active():
+        conn = get_db_connection()
+        if not conn:
+            return False
     
     try:
-        # Update the line_items table
-        cursor = conn.cursor()
-        cursor.execute('''
-        UPDATE line_items SET 
-            BR_paid = ?,
-            BR_rate = ?,
-            EOBR_doc_no = ?,
-            HCFA_doc_no = ?,
-            BR_date_processed = ?,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = ? AND Order_ID = ?
-        ''', (br_paid, br_rate, eobr_doc_no, hcfa_doc_no, br_date_processed, line_item_id, order_id))
-        
-        rows_affected = cursor.rowcount
-        conn.commit()
-        
-        # Increment the BILLS_PAID counter for the order
-        # We'll use a new EOBR document number to determine if this is a new bill
-        if rows_affected > 0:
-            increment_bills_paid(order_id)
+        # Update the line_items table, then increment the BILLS_PAID counter
+        # for the order in the same transaction
+        if conn is None:
+            rows_affected = _update_payment_info_remote(params)
+        else:
+            cursor = conn.cursor()
+            rows_affected = _execute_write(cursor, _SQL_UPDATE_PAYMENT, params)
+            if rows_affected > 0:
+                _bump_bills_paid(cursor, order_id)
+                mark_dirty()
+            _commit(conn)
         
         logger.info(f"Updated payment info for line item {line_item_id}, order {order_id}: {rows_affected} row(s) affected")
-        
-        # If using remote DB, push changes back to server
-        if USE_REMOTE_DB:
-            conn.close()  # Close before pushing
-            push_db_changes_to_remote(db_path)
-            
-            # Clean up temp file
-            if db_path and os.path.exists(db_path) and db_path != DB_PATH:
-                os.unlink(db_path)
-        else:
-            conn.close()
             
         db_logger.log(
             function="update_payment_info",
@@ -431,13 +953,8 @@ def update_payment_info(line_item_id, order_id, br_paid, br_rate, eobr_doc_no, h
         
     except Exception as e:
         logger.error(f"Error updating payment info: {e}")
-        conn.rollback()
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
+        if conn is not None:
+            _rollback(conn)
         db_logger.log(
             function="update_payment_info",
             action="update",
@@ -454,32 +971,235 @@ def update_payment_info(line_item_id, order_id, br_paid, br_rate, eobr_doc_no, h
         )
         return False
 
-def list_line_items(order_id=None):
-    """List line items in the database, optionally filtered by order_id"""
-    conn, db_path = get_db_connection()
+def _update_payment_info_remote(params):
+    """
+    Apply update_payment_info()'s two writes on the server as one sqlite3
+    script inside BEGIN/COMMIT; with -bail a failure in either leaves both undone
+    
+    Returns:
+        int: Number of line items updated
+    """
+    line_item_id, order_id = params[-2:]
+    rows = _run_remote_sql(
+        "BEGIN;\n"
+        f"{_bind(_SQL_UPDATE_PAYMENT, params)};\n"
+        "SELECT changes();\n"
+        f"{_bind(_SQL_INCREMENT_BILLS_PAID_FOR_ITEM, (order_id, line_item_id, order_id))};\n"
+        "COMMIT;"
+    )
+    forget_cached_reads()
+    return rows[0][0] if rows else 0
+
+def bulk_update_payment_info(rows):
+    """
+    Update payment information for several line items in one transaction
+    
+    The matching line items are looked up first (a few SELECTs of up to
+    _PAID_BULK_CHUNK pairs), then updated with a single executemany() and
+    BILLS_PAID is incremented once per updated line item, as
+    update_payment_info() does.
+    
+    Args:
+        rows (list): (line_item_id, order_id, br_paid, br_rate, eobr_doc_no,
+            hcfa_doc_no, br_date_processed) tuples
+        
+    Returns:
+        list: One bool per row, True if that line item was updated
+    """
+    rows = [tuple(row) for row in rows]
+    results = [False] * len(rows)
+    valid = [i for i, row in enumerate(rows) if row[0] and row[1]]
+    if not valid:
+        return results
+    
+    if _remote_sql_active():
+        # No local copy to batch against - each row is its own CLI call
+        return [update_payment_info(*row) for row in rows]
+    
+    conn = get_db_connection()
     if not conn:
-        return
+        return results
     
     try:
         cursor = conn.cursor()
         
+        # line_items stores id/Order_ID as TEXT; a row is updated iff its pair exists
+        pairs = list(dict.fromkeys((str(rows[i][0]), str(rows[i][1])) for i in valid))
+        existing = set()
+        for start in range(0, len(pairs), _PAID_BULK_CHUNK):
+            chunk = pairs[start:start + _PAID_BULK_CHUNK]
+            sql = _SQL_EXISTING_ITEMS.format(values=",".join(["(?,?)"] * len(chunk)))
+            cursor.execute(sql, [v for pair in chunk for v in pair])
+            existing.update((str(row[0]), str(row[1])) for row in cursor.fetchall())
+        matched = [i for i in valid if (str(rows[i][0]), str(rows[i][1])) in existing]
+        
+        # Same parameter order as update_payment_info: payment columns, then id/Order_ID
+        rows_affected = _execute_many_write(cursor, _SQL_UPDATE_PAYMENT, [rows[i][2:] + rows[i][:2] for i in matched])
+        
+        per_order = Counter(rows[i][1] for i in matched)
+        _execute_many_write(cursor, _SQL_ADD_BILLS_PAID, [(count, order_id) for order_id, count in per_order.items()])
+        
+        if matched:
+            mark_dirty()
+        _commit(conn)
+        
+        for i in matched:
+            results[i] = True
+        
+        logger.info(f"Bulk updated payment info for {len(rows)} line item(s): {rows_affected} row(s) affected")
+        db_logger.log(
+            function="bulk_update_payment_info",
+            action="update",
+            params={"rows": len(rows)},
+            result=f"rows_affected: {rows_affected}"
+        )
+        return results
+        
+    except Exception as e:
+        logger.error(f"Error bulk updating payment info: {e}")
+        _rollback(conn)
+        db_logger.log(
+            function="bulk_update_payment_info",
+            action="update",
+            params={"rows": len(rows)},
+            result=f"Exception: {e}"
+        )
+        return [False] * len(rows)
+
+class PaymentBatch:
+    """
+    Applies payment updates on one open connection inside a single transaction
+    
+    Obtain one through payment_batch(); the transaction is committed when the
+    with-block exits.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor() if conn else None
+        self.rows_affected = 0
+
+    def update(self, line_item_id, order_id, br_paid, br_rate, eobr_doc_no, hcfa_doc_no, br_date_processed):
+        """
+        Update payment information for a line item (same arguments as update_payment_info)
+        
+        Returns:
+            bool: True if the line item was updated, False otherwise
+        """
+        if not self.cursor or not line_item_id or not order_id:
+            return False
+        
+        rows_affected = _execute_write(self.cursor, _SQL_UPDATE_PAYMENT, (br_paid, br_rate, eobr_doc_no, hcfa_doc_no, br_date_processed, line_item_id, order_id))
+        
+        if rows_affected > 0:
+            _bump_bills_paid(self.cursor, order_id)
+            self.rows_affected += rows_affected
+        
+        db_logger.log(
+            function="PaymentBatch.update",
+            action="update",
+            params={
+                "line_item_id": line_item_id,
+                "order_id": order_id,
+                "br_paid": br_paid,
+                "br_rate": br_rate,
+                "eobr_doc_no": eobr_doc_no,
+                "hcfa_doc_no": hcfa_doc_no,
+                "br_date_processed": br_date_processed
+            },
+            result=f"rows_affected: {rows_affected}"
+        )
+        return rows_affected > 0
+
+@contextmanager
+def db_batch(push=True):
+    """
+    Run several writes as one transaction
+    
+    update_payment_info(), increment_bills_paid() and PaymentBatch.update()
+    called inside the block don't commit on their own; everything is
+    committed (or rolled back on an exception) when the outermost block
+    exits. Nested blocks join the outer transaction.
+    
+    Usage:
+        with db_batch():
+            for item in items:
+                update_payment_info(...)
+    
+    Args:
+        push (bool): Upload the database to the remote once after committing
+        
+    Yields:
+        sqlite3.Connection or None: The connection, None if the database can't be opened
+    """
+    global _BATCH_DEPTH
+    conn = get_db_connection()
+    if not conn:
+        yield None
+        return
+    
+    if _BATCH_DEPTH:
+        _BATCH_DEPTH += 1
+        try:
+            yield conn
+        finally:
+            _BATCH_DEPTH -= 1
+        return
+    
+    changes_before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")
+    _BATCH_DEPTH = 1
+    try:
+        yield conn
+        conn.commit()
+        _CHANGELOG.extend(_PENDING)
+    except Exception as e:
+        logger.error(f"Error in database batch, rolling back: {e}")
+        conn.rollback()
+        raise
+    finally:
+        _BATCH_DEPTH = 0
+        _PENDING.clear()
+        # Dropped after the commit (or rollback), not per write: reads made
+        # during the batch may not see its uncommitted changes
+        forget_cached_reads()
+    
+    if conn.total_changes != changes_before:
+        mark_dirty()
+        if push:
+            flush_db_to_remote()
+
+@contextmanager
+def payment_batch():
+    """
+    Group payment updates into one transaction
+    
+    The upload to the remote is left to close_db()/flush_db_to_remote().
+    
+    Usage:
+        with payment_batch() as batch:
+            batch.update(line_item_id, order_id, ...)
+    
+    If the database can't be opened the batch's update() always returns False.
+    """
+    with db_batch(push=False) as conn:
+        batch = PaymentBatch(conn)
+        yield batch
+    logger.info(f"Committed payment batch: {batch.rows_affected} row(s) affected")
+
+def list_line_items(order_id=None):
+    """List line items in the database, optionally filtered by order_id"""
+    try:
         if order_id:
-            cursor.execute('SELECT id, Order_ID, CPT, BR_paid, BR_rate, EOBR_doc_no FROM line_items WHERE Order_ID = ?', (order_id,))
+            rows = _fetch_rows(_SQL_LIST_ITEMS, (order_id,))
         else:
-            cursor.execute('SELECT id, Order_ID, CPT, BR_paid, BR_rate, EOBR_doc_no FROM line_items LIMIT 10')
-        
-        rows = cursor.fetchall()
+            rows = _fetch_rows(_SQL_LIST_ITEMS_SAMPLE, ())
+        if rows is None:
+            return
         
         logger.info(f"Found {len(rows)} line items:")
         for row in rows:
             logger.info(f"  ID: {row[0]}, Order: {row[1]}, CPT: {row[2]}, Paid: {row[3]}, Rate: {row[4]}, EOBR: {row[5]}")
             
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="list_line_items",
             action="read",
@@ -489,12 +1209,6 @@ def list_line_items(order_id=None):
         return rows
     except Exception as e:
         logger.error(f"Error listing line items: {e}")
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="list_line_items",
             action="read",
@@ -503,10 +1217,16 @@ def list_line_items(order_id=None):
         )
         return None
 
+# BILLS_PAID values for orders read since the last write
+_bills_paid_cache = {}
+
 def get_bills_paid_count(order_id):
     """
     Get the current BILLS_PAID count for an order
     
+    Results are memoized until the next write committed through this module
+    (see forget_cached_reads()) or close_db().
+    
     Args:
         order_id (str): The order ID
         
@@ -516,19 +1236,31 @@ def get_bills_paid_count(order_id):
     if not order_id:
         return 0
     
-    conn, db_path = get_db_connection()
-    if not conn:
+    if order_id in _bills_paid_cache:
+        return _bills_paid_cache[order_id]
+    
+    bills_paid = _get_bills_paid_count_uncached(order_id)
+    if bills_paid is None:
+        # Lookup failed - don't remember the failure
         return 0
+    _bills_paid_cache[order_id] = bills_paid
+    return bills_paid
+
+get_bills_paid_count.cache_clear = _bills_paid_cache.clear
+
+def _get_bills_paid_count_uncached(order_id):
+    """
+    Query the database for an order's BILLS_PAID count
     
+    Returns:
+        int or None: The count, None if the lookup failed
+    """
     try:
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT BILLS_PAID FROM orders WHERE Order_ID = ?',
-            (order_id,)
-        )
+        rows = _fetch_rows(_SQL_BILLS_PAID, (order_id,))
+        if rows is None:
+            return None
         
-        result = cursor.fetchone()
+        result = rows[0] if rows else None
         
         # If result is None or BILLS_PAID is None, treat as 0
         bills_paid = result[0] if result and result[0] is not None else 0
@@ -539,12 +1271,6 @@ def get_bills_paid_count(order_id):
         except (ValueError, TypeError):
             bills_paid = 0
         
-        conn.close()
-        
-        # Clean up temp file if using remote
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="get_bills_paid_count",
             action="read",
@@ -555,15 +1281,20 @@ def get_bills_paid_count(order_id):
         return bills_paid
     except Exception as e:
         logger.error(f"Error getting bills paid count: {e}")
-        conn.close()
-        
-        if USE_REMOTE_DB and db_path and os.path.exists(db_path) and db_path != DB_PATH:
-            os.unlink(db_path)
-            
         db_logger.log(
             function="get_bills_paid_count",
             action="read",
             params={"order_id": order_id},
             result=f"Exception: {e}"
         )
-        return 0
\ No newline at end of file
+        return None
+
+def forget_cached_reads():
+    """
+    Drop the memoized paid-status and BILLS_PAID reads
+    
+    Every write this module commits (or rolls back) calls it. Code that
+    writes to the database some other way should call it too.
+    """
+    _item_paid_cache.clear()
+    _bills_paid_cache.clear()
@@ -1,10 +1,32 @@
+import json
 import os
+import sqlite3
 from pathlib import Path
 from openpyxl import Workbook, load_workbook
-from config.settings import EXCEL_HEADERS, HISTORICAL_EXCEL_PATH
+from config.settings import EXCEL_HEADERS, HISTORICAL_EXCEL_PATH, HISTORICAL_INDEX_PATH, HISTORICAL_PARQUET_DIR
 import shutil
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # historical rows stay in the workbook
+    pa = pq = None
+
+# With CDX_HISTORICAL_PARQUET=1 (and pyarrow installed) new historical rows go
+# to a parquet dataset partitioned by run date instead of the workbook; the
+# workbook keeps the rows written before the switch.
+HISTORICAL_PARQUET = os.environ.get("CDX_HISTORICAL_PARQUET", "0") == "1" and pq is not None
+
+# SQLite mirror of the historical workbook's duplicate keys and EOBR serials,
+# so startup doesn't have to parse the workbook. workbook_mtime records which
+# version of the workbook the rows match; any other version triggers a rebuild.
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS eobr_log (dup_key TEXT, control_number TEXT, serial INTEGER);
+CREATE INDEX IF NOT EXISTS idx_eobr_log_control ON eobr_log(control_number);
+CREATE TABLE IF NOT EXISTS eobr_log_meta (workbook_mtime REAL);
+"""
+
 def backup_excel_file(file_path):
     """Create a backup of the Excel file"""
     if not Path(file_path).exists():
@@ -27,50 +49,153 @@ def initialize_excel_file(file_path):
         wb.save(file_path)
         print(f"Created new Excel file at: {file_path}")
 
+def _history_entry(full_dup_key, eobr_number_value, description):
+    """
+    Derive the duplicate key and EOBR control/serial numbers for a historical row
+    
+    Returns:
+        tuple: (duplicate key, control number or None, serial number or None)
+    """
+    control_number = serial_part = None
+    if eobr_number_value and '-' in eobr_number_value:
+        control_number, _, serial_part = eobr_number_value.partition('-')
+    
+    if full_dup_key and '|' in full_dup_key:
+        historical_key = full_dup_key
+    elif control_number and description:
+        cpt_part = description.partition(',')[0].strip()
+        historical_key = f"{control_number}|{cpt_part}"
+    else:
+        historical_key = full_dup_key or "Unknown"
+    
+    if not control_number:
+        return historical_key, None, None
+    # isdecimal() accepts exactly what int() parses here, so no try/except
+    serial_part = serial_part.partition('-')[0]
+    serial_number = int(serial_part) if serial_part.isdecimal() else 0
+    return historical_key, control_number, serial_number
+
+def _read_historical_workbook():
+    """Parse every row of the historical workbook into _history_entry() tuples"""
+    wb = load_workbook(os.fspath(HISTORICAL_EXCEL_PATH), read_only=True)
+    ws = wb.active
+    # Values only, and only up to the Description column (L)
+    entries = [
+        _history_entry(row[2], row[4], row[11])
+        for row in ws.iter_rows(min_row=2, max_col=12, values_only=True)
+    ]
+    wb.close()
+    return entries
+
+def _read_historical_parquet():
+    """Parse the historical parquet dataset (if any) into _history_entry() tuples"""
+    if pq is None or not HISTORICAL_PARQUET_DIR.exists():
+        return []
+    columns = pq.read_table(
+        HISTORICAL_PARQUET_DIR, columns=["Full Duplicate Key", "EOBR Number", "Description"]
+    ).to_pydict()
+    return [
+        _history_entry(*row)
+        for row in zip(columns["Full Duplicate Key"], columns["EOBR Number"], columns["Description"])
+    ]
+
+def _write_historical_parquet(rows):
+    """Add rows to the historical parquet dataset as one new file in today's partition"""
+    # Every column is stored as text so all partitions share one schema
+    columns = {
+        header: [None if row[i] is None else str(row[i]) for row in rows]
+        for i, header in enumerate(EXCEL_HEADERS)
+    }
+    columns["run_date"] = [datetime.now().strftime("%Y-%m-%d")] * len(rows)
+    schema = pa.schema([(name, pa.string()) for name in columns])
+    pq.write_to_dataset(pa.table(columns, schema=schema), root_path=HISTORICAL_PARQUET_DIR, partition_cols=["run_date"])
+
+def _read_pending_rows(file_path):
+    """The rows queued in an Excel file's sidecar and not yet flushed"""
+    pending = pending_path(file_path)
+    if not pending.exists():
+        return []
+    with open(pending, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _read_historical_pending():
+    """Parse the historical rows still queued in the sidecar into _history_entry() tuples"""
+    return [_history_entry(row[2], row[4], row[11]) for row in _read_pending_rows(HISTORICAL_EXCEL_PATH)]
+
+def _count_historical_rows():
+    """
+    Count the rows in the historical workbook, parquet dataset and sidecar
+    without parsing the workbook or dataset
+
+    Returns:
+        int or None: The row count, None if the workbook doesn't record its size
+    """
+    wb = load_workbook(os.fspath(HISTORICAL_EXCEL_PATH), read_only=True)
+    max_row = wb.active.max_row
+    wb.close()
+    if max_row is None:
+        return None
+    count = max_row - 1  # header row
+    if pq is not None and HISTORICAL_PARQUET_DIR.exists():
+        count += pq.read_table(HISTORICAL_PARQUET_DIR, columns=["EOBR Number"]).num_rows
+    return count + len(_read_pending_rows(HISTORICAL_EXCEL_PATH))
+
+def _open_history_index():
+    """Open the historical index database, creating its tables if needed"""
+    conn = sqlite3.connect(HISTORICAL_INDEX_PATH)
+    conn.executescript(_HISTORY_SCHEMA)
+    return conn
+
+def _set_index_mtime(conn):
+    """Mark the index as matching the historical workbook as it is on disk now"""
+    conn.execute("DELETE FROM eobr_log_meta")
+    conn.execute("INSERT INTO eobr_log_meta VALUES (?)", (HISTORICAL_EXCEL_PATH.stat().st_mtime,))
+
 def load_historical_duplicates():
-    """Load historical duplicates and control numbers from Excel"""
-    historical_duplicates = {}
+    """
+    Load historical duplicates and control numbers from the historical index (rebuilt from Excel when stale)
+    
+    Returns:
+        tuple: (frozenset of duplicate keys, dict of highest EOBR serial per control number)
+    """
+    historical_duplicates = frozenset()
     max_control_numbers = {}
     
-    if Path(HISTORICAL_EXCEL_PATH).exists():
+    if HISTORICAL_EXCEL_PATH.exists():
+        # Fold in rows a previous run queued but never flushed. If the workbook
+        # can't be written (e.g. it is open in Excel) they stay in the sidecar,
+        # which the index below still counts and reads
         try:
-            wb = load_workbook(HISTORICAL_EXCEL_PATH, read_only=True)
-            ws = wb.active
-            rows = list(ws.rows)[1:]  # Skip header
-            
-            for row in rows:
-                full_dup_key = row[2].value if len(row) > 2 else None
-                eobr_number_value = row[4].value if len(row) > 4 else None
-                description = row[11].value if len(row) > 11 else None
+            flush_excel_appends(HISTORICAL_EXCEL_PATH)
+        except Exception as e:
+            print(f"Error flushing queued historical rows, they stay in {pending_path(HISTORICAL_EXCEL_PATH)}: {e}")
+        
+        try:
+            conn = _open_history_index()
+            try:
+                indexed = conn.execute("SELECT workbook_mtime FROM eobr_log_meta").fetchone()
+                indexed_rows = conn.execute("SELECT COUNT(*) FROM eobr_log").fetchone()[0]
+                if (
+                    indexed is None
+                    or indexed[0] != HISTORICAL_EXCEL_PATH.stat().st_mtime
+                    or indexed_rows != _count_historical_rows()
+                ):
+                    # Workbook changed outside this module, or the index missed
+                    # (or kept) rows the workbook didn't - re-mirror it
+                    entries = _read_historical_workbook() + _read_historical_parquet() + _read_historical_pending()
+                    with conn:
+                        conn.execute("DELETE FROM eobr_log")
+                        conn.executemany("INSERT INTO eobr_log VALUES (?, ?, ?)", entries)
+                        _set_index_mtime(conn)
                 
-                if full_dup_key and '|' in full_dup_key:
-                    historical_key = full_dup_key
-                else:
-                    control_number = None
-                    if eobr_number_value and '-' in eobr_number_value:
-                        control_number = eobr_number_value.split('-')[0]
-                    if control_number and description:
-                        cpt_part = description.split(',')[0].strip()
-                        historical_key = f"{control_number}|{cpt_part}"
-                    else:
-                        historical_key = full_dup_key or "Unknown"
-                        
-                if historical_key:
-                    historical_duplicates[historical_key] = True
-                    
-                if eobr_number_value and '-' in eobr_number_value:
-                    parts = eobr_number_value.split('-')
-                    control_number = parts[0]
-                    try:
-                        serial_number = int(parts[1])
-                    except (ValueError, IndexError):
-                        serial_number = 0
-                    if control_number:
-                        max_control_numbers[control_number] = max(
-                            max_control_numbers.get(control_number, 0),
-                            serial_number
-                        )
-            wb.close()
+                historical_duplicates = frozenset(
+                    row[0] for row in conn.execute("SELECT DISTINCT dup_key FROM eobr_log WHERE dup_key IS NOT NULL")
+                )
+                max_control_numbers = dict(conn.execute(
+                    "SELECT control_number, MAX(serial) FROM eobr_log WHERE control_number IS NOT NULL GROUP BY control_number"
+                ))
+            finally:
+                conn.close()
             
         except Exception as e:
             print(f"Error loading historical Excel file: {e}")
@@ -89,18 +214,94 @@ def load_historical_duplicates():
         
     return historical_duplicates, max_control_numbers
 
+def pending_path(file_path):
+    """Sidecar file collecting the rows appended to an Excel file until the next flush"""
+    return Path(file_path).with_suffix(".pending.jsonl")
+
+def _append_rows(file_path, rows):
+    """
+    Append rows to an Excel file with a single load/save
+
+    The workbook is loaded in full so every sheet, style, number format and
+    column width survives the save. It is saved to a temp file that replaces
+    the original only once the save has succeeded.
+    """
+    wb = load_workbook(os.fspath(file_path))
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+
+    tmp_path = f"{file_path}.tmp"
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        # Only left behind if the save or the replace failed
+        Path(tmp_path).unlink(missing_ok=True)
+
 def append_to_excel(file_path, data):
-    """Append data to Excel file"""
+    """
+    Queue a row for an Excel file
+    
+    Rows go to a JSON-lines sidecar next to the workbook, which costs one
+    small write instead of re-reading and re-saving the whole workbook per
+    row; flush_excel_appends() moves them into the workbook.
+    """
+    line = json.dumps([data.get(header) for header in EXCEL_HEADERS], default=str) + "\n"
+    if Path(file_path) != HISTORICAL_EXCEL_PATH:
+        _queue_line(file_path, line)
+        return
+    
+    # The index row is only committed once the row is queued, so a failed
+    # queue write leaves the index as it was. If the index write fails the
+    # row is still queued; load_historical_duplicates() sees the index is a
+    # row short and rebuilds it from the workbook.
+    conn = None
     try:
-        wb = load_workbook(file_path)
-        ws = wb.active
-        ws.append([
-            data.get("Release Payment"), data.get("Duplicate Check"), data.get("Full Duplicate Key"),
-            data.get("Input File"), data.get("EOBR Number"), data.get("Vendor"), data.get("Mailing Address"),
-            data.get("Terms"), data.get("Bill Date"), data.get("Due Date"), data.get("Category"), data.get("Description"),
-            data.get("Amount"), data.get("Memo"), data.get("Total"),
-        ])
-        wb.save(file_path)
+        conn = _open_history_index()
+        conn.execute(
+            "INSERT INTO eobr_log VALUES (?, ?, ?)",
+            _history_entry(data.get("Full Duplicate Key"), data.get("EOBR Number"), data.get("Description"))
+        )
+    except Exception as e:
+        print(f"Error updating historical index: {e}")
+        if conn is not None:
+            conn.close()
+            conn = None
+    
+    try:
+        _queue_line(file_path, line)
+        if conn is not None:
+            try:
+                conn.commit()
+            except Exception as e:
+                print(f"Error updating historical index: {e}")
+    finally:
+        if conn is not None:
+            # Closing without a commit rolls the index row back
+            conn.close()
+
+def _queue_line(file_path, line):
+    """Add one JSON-encoded row to an Excel file's sidecar"""
+    with open(pending_path(file_path), "a", encoding="utf-8") as f:
+        f.write(line)
+
+def flush_excel_appends(file_path):
+    """Write the rows queued by append_to_excel() into the Excel file in one save"""
+    pending = pending_path(file_path)
+    if not pending.exists():
+        return
+    rows = _read_pending_rows(file_path)
+    
+    if HISTORICAL_PARQUET and Path(file_path) == HISTORICAL_EXCEL_PATH:
+        # The workbook (and so the index's recorded mtime) is left as it is;
+        # append_to_excel() already indexed these rows
+        _write_historical_parquet(rows)
+        pending.unlink()
+        return
+    
+    try:
+        _append_rows(file_path, rows)
     except Exception as e:
         print(f"Error appending to Excel file: {e}")
         print("Attempting to recover...")
@@ -113,12 +314,17 @@ def append_to_excel(file_path, data):
         print("Created new Excel file and retrying append...")
         
         # Retry the append
-        wb = load_workbook(file_path)
-        ws = wb.active
-        ws.append([
-            data.get("Release Payment"), data.get("Duplicate Check"), data.get("Full Duplicate Key"),
-            data.get("Input File"), data.get("EOBR Number"), data.get("Vendor"), data.get("Mailing Address"),
-            data.get("Terms"), data.get("Bill Date"), data.get("Due Date"), data.get("Category"), data.get("Description"),
-            data.get("Amount"), data.get("Memo"), data.get("Total"),
-        ])
-        wb.save(file_path)
\ No newline at end of file
+        _append_rows(file_path, rows)
+    
+    pending.unlink()
+    
+    # append_to_excel() already indexed these rows; record that the index
+    # matches the new workbook (the row count check catches any it missed)
+    if Path(file_path) == HISTORICAL_EXCEL_PATH:
+        try:
+            conn = _open_history_index()
+            with conn:
+                _set_index_mtime(conn)
+            conn.close()
+        except Exception as e:
+            print(f"Error updating historical index: {e}")
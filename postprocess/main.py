@@ -1,19 +1,46 @@
+import asyncio
 import boto3
+from botocore.config import Config
 import json
+import logging
+import multiprocessing
 import os
 import glob
+import itertools
+import threading
+import traceback
+from collections import deque
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib parser
+    orjson = None
+
+try:
+    # Async S3 client; downloads run on one event loop instead of a thread each
+    import aioboto3
+except ImportError:  # fall back to the boto3 thread pool
+    aioboto3 = None
+
+try:
+    # Writes the DB-updates sheet row by row, without building a DataFrame
+    import xlsxwriter
+except ImportError:  # fall back to pandas
+    xlsxwriter = None
 
 # Import from modules
 from config.settings import BASE_PATH, HISTORICAL_EXCEL_PATH
 from utils.validators import validate_record
-from data.excel_manager import initialize_excel_file, load_historical_duplicates, append_to_excel
-from processors.document_processor import generate_document
+from data.excel_manager import initialize_excel_file, load_historical_duplicates, append_to_excel, flush_excel_appends, pending_path
+from processors.document_processor import generate_document, preload_template
 from processors.eobr_processor import collect_additional_eobr_data
-from data.db_manager import check_if_item_paid, update_payment_info, list_line_items, check_if_order_has_payments
-from data.db_logger import db_logger
+from data.db_manager import initialize_database, check_if_item_paid, list_line_items, check_if_order_has_payments, bulk_update_payment_info, close_db
+from data.db_logger import db_logger, PARQUET_AVAILABLE
+
+logger = logging.getLogger(__name__)
 
 def setup_folder_structure():
     """Create folder structure for current run"""
@@ -35,22 +62,59 @@ def setup_folder_structure():
     folder_structure['db_updates_excel'] = os.path.join(folder_structure['excel'], f"Database_Updates_{current_date}.xlsx")
     return folder_structure
 
-def adapt_record_format(record, filename):
+def preload():
+    """
+    Open the database and load the historical duplicates at the same time
+    
+    The database download is network-bound and the historical load is disk/CPU
+    bound, so running them side by side costs the longer of the two.
+    
+    Returns:
+        tuple: (database ready, historical duplicate keys, max serial per control number)
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        db_future = executor.submit(initialize_database)
+        historical_future = executor.submit(load_historical_duplicates)
+        return (db_future.result(), *historical_future.result())
+
+# Billing_Address field -> FileMaker provider column
+BILLING_ADDRESS_FIELDS = {
+    "Address": "Billing Address 1",
+    "City": "Billing Address City",
+    "State": "Billing Address State",
+    "Postal_Code": "Billing Address Postal Code",
+}
+
+def parse_billing_address(billing_address_str):
+    """Split a combined "street, city, ST zip" billing address into Billing_Address fields"""
+    address_parts = billing_address_str.split(",")
+    state_zip = address_parts[2].split() if len(address_parts) > 2 else []
+    return {
+        "Address": address_parts[0],
+        "City": address_parts[1].strip() if len(address_parts) > 1 else "",
+        "State": state_zip[0] if state_zip else "",
+        "Postal_Code": state_zip[1] if len(state_zip) > 1 else "",
+    }
+
+def adapt_record_format(record, filename, timestamp=None):
     """
     Adapt the S3 JSON format to match what all processors expect
     Based on the exact structure of the sample JSON provided
+    
+    timestamp (ISO string) defaults to now; a run passes its start time once.
     """
+    # FileMaker data, looked up once
+    filemaker = record.get("filemaker", {})
+    fm_provider = filemaker.get("provider", {})
+    fm_order = filemaker.get("order", {})
+    
     # Extract the order ID for debugging
-    order_id = record.get("filemaker", {}).get("order", {}).get("Order_ID")
-    print(f"  [DEBUG] Processing {filename} with Order ID: {order_id}")
+    order_id = fm_order.get("Order_ID")
+    logger.debug("Processing %s with Order ID: %s", filename, order_id)
     
     # Extract billing info
     billing_info = record.get("billing_info", {})
     
-    # Get the properly formatted provider info
-    fm_provider = record.get("filemaker", {}).get("provider", {})
-    fm_order = record.get("filemaker", {}).get("order", {})
-    
     # Service lines from top level
     service_lines = record.get("service_lines", [])
     
@@ -62,24 +126,24 @@ def adapt_record_format(record, filename):
         "NPI": fm_provider.get("NPI", ""),
     }
     
-    # Create the billing address structure
-    # Split the combined address if needed
-    billing_address_str = billing_info.get("billing_provider_address", "")
-    address_parts = billing_address_str.split(",")
-    
-    provider_info["Billing_Address"] = {
-        "Address": fm_provider.get("Billing Address 1", address_parts[0] if address_parts else ""),
-        "City": fm_provider.get("Billing Address City", address_parts[1].strip() if len(address_parts) > 1 else ""),
-        "State": fm_provider.get("Billing Address State", address_parts[2].split()[0] if len(address_parts) > 2 else ""),
-        "Postal_Code": fm_provider.get("Billing Address Postal Code", address_parts[2].split()[1] if len(address_parts) > 2 and len(address_parts[2].split()) > 1 else ""),
-    }
+    # Create the billing address structure from the FileMaker provider,
+    # splitting the combined address only for fields FileMaker lacks
+    if all(key in fm_provider for key in BILLING_ADDRESS_FIELDS.values()):
+        provider_info["Billing_Address"] = {
+            field: fm_provider[key] for field, key in BILLING_ADDRESS_FIELDS.items()
+        }
+    else:
+        parsed_address = parse_billing_address(billing_info.get("billing_provider_address", ""))
+        provider_info["Billing_Address"] = {
+            field: fm_provider.get(key, parsed_address[field]) for field, key in BILLING_ADDRESS_FIELDS.items()
+        }
     
     # Create the adapted record in the format expected by processors
     adapted_record = {
         "file_info": {
             "file_name": filename,
             "order_id": order_id,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
         },
         "validation_summary": {
             "status": "PASS",
@@ -105,16 +169,18 @@ def adapt_record_format(record, filename):
         "order_id": order_id
     }
     
+    # FileMaker line items by CPT - built in reverse so the first match wins
+    fm_items_by_cpt = {
+        line_item.get("CPT"): line_item
+        for line_item in reversed(filemaker.get("line_items", []))
+    }
+    
     # Add line items from service_lines
     for service_line in service_lines:
         cpt_code = service_line.get("cpt_code")
         
         # Look for matching line item in filemaker data to get the ID
-        matching_line_item = None
-        for line_item in record.get("filemaker", {}).get("line_items", []):
-            if line_item.get("CPT") == cpt_code:
-                matching_line_item = line_item
-                break
+        matching_line_item = fm_items_by_cpt.get(cpt_code)
         
         # Create the line item in the expected format
         new_line_item = {
@@ -138,60 +204,232 @@ def adapt_record_format(record, filename):
 
 def debug_validate_record(record):
     """
-    Debug version of validate_record that prints which check failed
+    Debug version of validate_record that logs which check failed
     """
     if "data" not in record:
-        print("  [DEBUG] Missing 'data' key in record.")
+        logger.debug("Missing 'data' key in record.")
         return False
     data = record.get("data", {})
     line_items = data.get("line_items", [])
     if not line_items:
-        print("  [DEBUG] No line items found in record['data']['line_items'].")
+        logger.debug("No line items found in record['data']['line_items'].")
         return False
     for idx, line in enumerate(line_items):
         if line.get("validated_rate") is None:
-            print(f"  [DEBUG] Line item {idx} missing 'validated_rate'. Line: {line}")
+            logger.debug("Line item %s missing 'validated_rate'. Line: %s", idx, line)
             return False
     if not data.get("date_of_service"):
         has_date = any(line.get("date_of_service") for line in line_items)
         if not has_date:
-            print("  [DEBUG] No 'date_of_service' found in record or any line item.")
+            logger.debug("No 'date_of_service' found in record or any line item.")
             return False
     patient_info = data.get("patient_info", {})
     if not patient_info.get("PatientName"):
-        print(f"  [DEBUG] Missing 'PatientName' in patient_info: {patient_info}")
+        logger.debug("Missing 'PatientName' in patient_info: %s", patient_info)
         return False
     provider_info = data.get("provider_info", {})
     if not provider_info.get("Billing_Name"):
-        print(f"  [DEBUG] Missing 'Billing_Name' in provider_info: {provider_info}")
+        logger.debug("Missing 'Billing_Name' in provider_info: %s", provider_info)
         return False
     return True
 
+def iter_json_keys(s3_client, bucket_name, prefix):
+    """
+    Yield the keys of the .json objects under a prefix, following every page
+    
+    list_objects_v2 returns at most 1000 keys per call, so the paginator is
+    needed to see the whole prefix. Keys are yielded as each page arrives.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    try:
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={'PageSize': 1000}):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.json'):
+                    yield obj['Key']
+    except Exception as e:
+        print(f"Error listing S3 bucket {bucket_name}: {e}")
+
+# Concurrent S3 downloads ahead of the (serial) processing loop
+S3_FETCH_WORKERS = 32
+S3_STREAM_CHUNK = 1024 * 1024  # bodies larger than this are streamed into one buffer
+
+def fetch_json_record(s3_client, bucket_name, key):
+    """
+    Download an S3 object and parse it as JSON
+    
+    Producers may stamp x-amz-meta-status on the object (validate_ready sets
+    it to PASS). If it is set to anything else the body is never read and
+    None is returned. Unstamped objects are always downloaded.
+    """
+    response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    if not status_passed(response):
+        response['Body'].close()
+        return None
+    return parse_json_bytes(read_s3_body(response))
+
+def status_passed(response):
+    """False if the object's x-amz-meta-status is set to something other than PASS"""
+    status = response.get('Metadata', {}).get('status')
+    return status is None or status == 'PASS'
+
+def read_s3_body(response):
+    """
+    Read a get_object() body into a single buffer
+    
+    Small bodies are read in one call. Larger ones are copied chunk by chunk
+    into a buffer sized from ContentLength, so a download never holds its
+    chunks and the joined result at the same time.
+    """
+    body = response['Body']
+    size = response.get('ContentLength')
+    if not size or size <= S3_STREAM_CHUNK:
+        return body.read()
+    
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    offset = 0
+    for chunk in body.iter_chunks(S3_STREAM_CHUNK):
+        view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    view.release()
+    # botocore raises if the body is shorter than ContentLength
+    return buffer
+
+def parse_json_bytes(data):
+    """Parse a UTF-8 JSON document straight from bytes (orjson when installed)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter (e.g. no NaN literals); let the stdlib decide
+            pass
+    return json.loads(data)
+
+def prefetch_json_records(s3_client, bucket_name, keys, workers=S3_FETCH_WORKERS):
+    """
+    Download and parse S3 JSON objects on a thread pool, keeping up to
+    2 x workers requests in flight
+    
+    Yields:
+        tuple: (key, future) in the order the keys were given; future.result()
+        returns the parsed record or raises the download/parse error
+    """
+    if aioboto3 is not None:
+        yield from prefetch_json_records_async(bucket_name, keys, 2 * workers)
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for key in keys:
+            window.append((key, executor.submit(fetch_json_record, s3_client, bucket_name, key)))
+            if len(window) >= 2 * workers:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+def prefetch_json_records_async(bucket_name, keys, window_size):
+    """
+    prefetch_json_records() on aioboto3: every download shares one event loop
+    on a background thread, with up to window_size requests in flight
+    
+    Yields:
+        tuple: (key, future) in the order the keys were given, like prefetch_json_records()
+    """
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    run = lambda coro: asyncio.run_coroutine_threadsafe(coro, loop)
+    
+    client_context = aioboto3.Session().client('s3', config=Config(max_pool_connections=window_size))
+    s3_client = run(client_context.__aenter__()).result()
+    
+    async def fetch(key):
+        response = await s3_client.get_object(Bucket=bucket_name, Key=key)
+        if not status_passed(response):
+            response['Body'].close()
+            return None
+        return parse_json_bytes(await response['Body'].read())
+    
+    window = deque()
+    try:
+        for key in keys:
+            window.append((key, run(fetch(key))))
+            if len(window) >= window_size:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+    finally:
+        # Anything still queued means the consumer stopped early
+        for _, future in window:
+            future.cancel()
+        run(client_context.__aexit__(None, None, None)).result()
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+
+# Documents render in worker processes; DB and Excel work stays on the main thread
+DOC_WORKERS = os.cpu_count() or 1
+
+def finish_document(pending, db_updates, processed_order_ids, processed_date=None):
+    """
+    Wait for a queued document and, once it is written, record the payment
+    
+    Args:
+        pending (tuple): (filename, order_id, record, eobr_data, future)
+        db_updates (list): Collects the updated line items
+        processed_order_ids (set): Collects the order IDs that were paid
+        processed_date (str): BR_date_processed value, today if not given
+        
+    Returns:
+        bool: True if the document was generated and the payment recorded
+    """
+    filename, order_id, adapted_record, eobr_data, future = pending
+    try:
+        future.result()
+        print(f"Generated EOBR {eobr_data['EOBR Number']}")
+        
+        # Update database with payment information (local)
+        updated_items = update_database_with_payment(adapted_record, eobr_data, processed_date)
+        if updated_items:
+            db_updates.extend(updated_items)
+        
+        # Track processed order ID
+        if order_id:
+            processed_order_ids.add(order_id)
+        return True
+    except Exception as e:
+        print(f"Error processing record for {filename}: {e}")
+        print(traceback.format_exc())
+        return False
+
 def process_s3_json_files(bucket_name, prefix):
     """Process JSON files from S3 bucket and generate EOBR reports"""
     # Setup
     folders = setup_folder_structure()
     initialize_excel_file(folders['current_excel'])
     initialize_excel_file(HISTORICAL_EXCEL_PATH)
-    historical_duplicates, processed_control_numbers = load_historical_duplicates()
-    
-    # Initialize S3 client
-    s3_client = boto3.client('s3')
+    db_ready, historical_duplicates, processed_control_numbers = preload()
+    # Duplicate keys issued earlier in this run
+    seen_dup_keys = set()
+    if not db_ready:
+        print("Warning: database could not be initialized; payment checks and updates will fail")
     
-    # List objects in the bucket with the given prefix
-    try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-    except Exception as e:
-        print(f"Error connecting to S3 bucket: {e}")
-        return
+    # Initialize S3 client - with a connection pool big enough for the prefetch threads
+    s3_client = boto3.client('s3', config=Config(max_pool_connections=2 * S3_FETCH_WORKERS))
     
-    # Check if there are any objects
-    if 'Contents' not in response:
-        print(f"No objects found in bucket {bucket_name} with prefix {prefix}")
+    # List objects in the bucket with the given prefix, page by page
+    json_keys = iter_json_keys(s3_client, bucket_name, prefix)
+    first_key = next(json_keys, None)
+    if first_key is None:
+        print(f"No JSON files found in bucket {bucket_name} with prefix {prefix}")
         return
+    json_files = itertools.chain([first_key], json_keys)
+    print(f"Processing JSON files from s3://{bucket_name}/{prefix}")
     
-    json_files = [obj['Key'] for obj in response['Contents'] if obj['Key'].endswith('.json')]
-    print(f"Found {len(json_files)} JSON files to process in S3 bucket.")
+    # Per-run timestamps, taken once rather than per record
+    now = datetime.now()
+    run_started = now.isoformat()
+    processed_date = now.strftime("%Y-%m-%d")
     
     processed_count = 0
     skipped_count = 0
@@ -200,15 +438,29 @@ def process_s3_json_files(bucket_name, prefix):
     # Track database updates
     db_updates = []
     
-    for json_key in json_files:
+    # Documents still rendering, oldest first; each record's DB update waits
+    # for its document so a failed render leaves the order unpaid
+    # Each worker parses the template once, as it starts. Workers are spawned
+    # rather than forked: preload() has left threads running (the SSH
+    # transport, the DB logger), and a fork would copy their locks mid-use
+    doc_pool = ProcessPoolExecutor(
+        max_workers=DOC_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=preload_template,
+    )
+    pending_docs = deque()
+    
+    # Downloads run ahead on a thread pool and documents on a process pool;
+    # Excel and DB work below stays serial and in listing order
+    for json_key, fetched in prefetch_json_records(s3_client, bucket_name, json_files):
         filename = os.path.basename(json_key)
         try:
-            # Get the object from S3
-            response = s3_client.get_object(Bucket=bucket_name, Key=json_key)
-            file_content = response['Body'].read().decode('utf-8')
-            
-            # Parse JSON content
-            record = json.loads(file_content)
+            # Get the downloaded and parsed object
+            record = fetched.result()
+            if record is None:
+                print(f"Skipping file {filename}: S3 status metadata is not PASS.")
+                skipped_count += 1
+                continue
             
             # Check validation status - looking for PASS in rate_check_info 
             # or moved_to_readyforprocess = true
@@ -220,16 +472,22 @@ def process_s3_json_files(bucket_name, prefix):
             
             if not validation_passed:
                 print(f"Skipping file {filename}: Validation checks did not pass.")
-                print(f"  [DEBUG] rate_check_info.status: {record.get('rate_check_info', {}).get('status')}")
-                print(f"  [DEBUG] processing_info.moved_to_readyforprocess: {record.get('processing_info', {}).get('moved_to_readyforprocess')}")
+                logger.debug("rate_check_info.status: %s", record.get('rate_check_info', {}).get('status'))
+                logger.debug("processing_info.moved_to_readyforprocess: %s", record.get('processing_info', {}).get('moved_to_readyforprocess'))
                 skipped_count += 1
                 continue
             
             # Adapt record to expected format
-            adapted_record = adapt_record_format(record, filename)
+            adapted_record = adapt_record_format(record, filename, run_started)
             
-            # Check if order has any payments
+            # Check if order has any payments - an earlier file for the same
+            # order may still be waiting on its document, so settle it first
             order_id = adapted_record.get("order_id")
+            while order_id and any(p[1] == order_id for p in pending_docs):
+                if finish_document(pending_docs.popleft(), db_updates, processed_order_ids, processed_date):
+                    processed_count += 1
+                else:
+                    skipped_count += 1
             if order_id and check_if_order_has_payments(order_id):
                 print(f"Skipping file {filename}: Order {order_id} has already been paid.")
                 skipped_count += 1
@@ -245,92 +503,147 @@ def process_s3_json_files(bucket_name, prefix):
             # Process the record using your existing processor
             try:
                 eobr_data = collect_additional_eobr_data(
-                    adapted_record, {}, historical_duplicates, processed_control_numbers
+                    adapted_record, {}, historical_duplicates, processed_control_numbers, seen_dup_keys
                 )
                 
                 # Save to Excel (local)
                 append_to_excel(folders['current_excel'], eobr_data)
                 append_to_excel(HISTORICAL_EXCEL_PATH, eobr_data)
                 
-                # Generate documents (local)
-                docx_path, pdf_path = generate_document(adapted_record, eobr_data, folders)
-                processed_count += 1
-                print(f"Generated EOBR {eobr_data['EOBR Number']}")
+                # Generate documents (local) in a worker process
+                future = doc_pool.submit(generate_document, adapted_record, eobr_data, folders)
+                pending_docs.append((filename, order_id, adapted_record, eobr_data, future))
                 
-                # Update database with payment information (local)
-                updated_items = update_database_with_payment(adapted_record, eobr_data)
-                if updated_items:
-                    db_updates.extend(updated_items)
-                
-                # Track processed order ID
-                if order_id:
-                    processed_order_ids.add(order_id)
+                # Record payments for documents that are done, in submission order
+                while pending_docs and (pending_docs[0][-1].done() or len(pending_docs) >= 2 * DOC_WORKERS):
+                    if finish_document(pending_docs.popleft(), db_updates, processed_order_ids, processed_date):
+                        processed_count += 1
+                    else:
+                        skipped_count += 1
                 
             except Exception as e:
-                import traceback
                 print(f"Error processing record for {filename}: {e}")
                 print(traceback.format_exc())
                 skipped_count += 1
                 
         except Exception as e:
-            import traceback
             print(f"Error reading or parsing file {filename}: {e}")
             print(traceback.format_exc())
             skipped_count += 1
     
+    # Wait for the remaining documents
+    while pending_docs:
+        if finish_document(pending_docs.popleft(), db_updates, processed_order_ids, processed_date):
+            processed_count += 1
+        else:
+            skipped_count += 1
+    doc_pool.shutdown()
+    
     print(f"Processing complete. Processed: {processed_count}, Skipped: {skipped_count}")
     
+    # Write the queued EOBR rows into the workbooks (one save each). A failed
+    # save leaves the rows in the sidecar and the rest of the shutdown runs
+    try:
+        flush_excel_appends(folders['current_excel'])
+    except Exception as e:
+        print(f"Error writing this run's EOBR rows to {folders['current_excel']}: {e}")
+        print(f"  The rows are still in {pending_path(folders['current_excel'])}; nothing flushes that file later, so copy them over by hand")
+    try:
+        flush_excel_appends(HISTORICAL_EXCEL_PATH)
+    except Exception as e:
+        print(f"Error writing this run's EOBR rows to {HISTORICAL_EXCEL_PATH}: {e}")
+        print(f"  The rows are still in {pending_path(HISTORICAL_EXCEL_PATH)} and count as duplicates; the next run adds them to the workbook")
+    
     # Save database updates to Excel (local)
     if db_updates:
-        df = pd.DataFrame(db_updates)
-        df.to_excel(folders['db_updates_excel'], index=False)
+        save_db_updates(folders['db_updates_excel'], db_updates)
         print(f"\nSaved database updates to: {folders['db_updates_excel']}")
     
-    # Save database interaction log to Excel (local)
-    db_log_path = os.path.join(folders['excel'], f"db_interactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-    db_logger.save_to_excel(db_log_path)
-    print(f"Database interactions log saved to: {db_log_path}")
+    # Save database interaction log (local) - only recorded when CDX_DB_LOG=1;
+    # parquet when pyarrow is installed, Excel otherwise
+    if db_logger.enabled:
+        db_log_path = os.path.join(folders['excel'], f"db_interactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        if PARQUET_AVAILABLE:
+            db_log_path += ".parquet"
+            db_logger.save_to_parquet(db_log_path)
+        else:
+            db_log_path += ".xlsx"
+            db_logger.save_to_excel(db_log_path)
+        print(f"Database interactions log saved to: {db_log_path}")
     
     # Verify database updates (local)
     print("\nVerifying database updates:")
     for order_id in processed_order_ids:
         list_line_items(order_id)
+    
+    # Push this run's changes to the remote database in one upload
+    close_db()
 
-def update_database_with_payment(record, eobr_data):
+def save_db_updates(path, db_updates):
+    """
+    Write the updated line items to an Excel file, one row per dict
+    
+    Args:
+        path (str): Output .xlsx path
+        db_updates (list): Dicts sharing the same keys, used as the header row
+    """
+    if xlsxwriter is None:
+        import pandas as pd
+        pd.DataFrame(db_updates).to_excel(path, index=False)
+        return
+    
+    headers = list(db_updates[0].keys())
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, headers)
+    for row_number, update in enumerate(db_updates, 1):
+        worksheet.write_row(row_number, 0, [update.get(header) for header in headers])
+    workbook.close()
+
+def update_database_with_payment(record, eobr_data, processed_date=None):
     """Update database with payment information for each line item"""
     order_id = record.get("order_id")
     eobr_number = eobr_data.get("EOBR Number")
-    processed_date = datetime.now().strftime("%Y-%m-%d")
+    processed_date = processed_date or datetime.now().strftime("%Y-%m-%d")
     
-    updated_items = []
+    lines = []
+    rows = []
     for line in record.get("data", {}).get("line_items", []):
         line_item_id = line.get("payment_id", {}).get("line_item_id")
         
         if line_item_id and order_id:
-            success = update_payment_info(
-                line_item_id=line_item_id,
-                order_id=order_id,
-                br_paid=str(line.get("validated_rate", 0)),
-                br_rate=float(line.get("validated_rate", 0)),
-                eobr_doc_no=eobr_number,
-                hcfa_doc_no=eobr_number,
-                br_date_processed=processed_date
-            )
-            
-            if success:
-                updated_items.append({
-                    'Line_Item_ID': line_item_id,
-                    'Order_ID': order_id,
-                    'CPT': line.get('cpt'),
-                    'BR_Paid': line.get("validated_rate", 0),
-                    'BR_Rate': line.get("validated_rate", 0),
-                    'EOBR_Doc_No': eobr_number,
-                    'Date_Processed': processed_date
-                })
+            rate = line.get("validated_rate", 0)
+            lines.append((line.get('cpt'), rate))
+            rows.append((
+                line_item_id,
+                order_id,
+                str(rate),
+                float(rate),
+                eobr_number,
+                eobr_number,
+                processed_date
+            ))
+    
+    # One transaction and one executemany for all of the record's line items
+    updated_items = []
+    for (cpt, rate), row, success in zip(lines, rows, bulk_update_payment_info(rows)):
+        if success:
+            updated_items.append({
+                'Line_Item_ID': row[0],
+                'Order_ID': order_id,
+                'CPT': cpt,
+                'BR_Paid': rate,
+                'BR_Rate': rate,
+                'EOBR_Doc_No': eobr_number,
+                'Date_Processed': processed_date
+            })
     
     return updated_items
 
 if __name__ == "__main__":
+    # CDX_LOG_LEVEL=DEBUG shows why each skipped record was rejected
+    logging.getLogger().setLevel(os.environ.get("CDX_LOG_LEVEL", "INFO").upper())
+    
     # S3 bucket information - update these values for your S3 bucket
     S3_BUCKET_NAME = "bill-review-prod"
     S3_PREFIX = "data/hcfa_json/EOBR_ready/"
@@ -1,13 +1,49 @@
+import copy
 import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from docx import Document
 from datetime import datetime
 from config.settings import WORD_TEMPLATE, ACCEPTABLE_MODIFIERS, ACCEPTABLE_POS
+from utils.formatters import parse_money
+
+try:
+    # C Aho-Corasick automaton: every placeholder in a text found in one scan
+    import ahocorasick
+except ImportError:  # fall back to the regex alternation
+    ahocorasick = None
+
+@lru_cache(maxsize=1)
+def _template_document():
+    """Parse the EOBR Word template once per process"""
+    return Document(WORD_TEMPLATE)
+
+def preload_template():
+    """Parse the template ahead of the first document (a process pool initializer)"""
+    _template_document()
+
+# Placeholder names for each of the template's 6 line rows, built once
+_LINE_FIELDS = ("dos", "cpt", "charge", "units", "modifier", "pos", "rate", "alwd", "paid", "code")
+_ROW_KEYS = [{field: f"<{field}{i}>" for field in _LINE_FIELDS} for i in range(1, 7)]
+_EMPTY_LINE_MAPPING = {key: "" for row in _ROW_KEYS for key in row.values()}
 
 def process_line_items(line_items):
-    """Process line items for document placeholders using adapted record format"""
-    mapping = {}
-    for i, line in enumerate(line_items[:6], start=1):
+    """
+    Process line items for document placeholders using adapted record format
+    
+    Returns:
+        tuple: (placeholder mapping for the first 6 lines, total validated_rate of all lines)
+    """
+    # Rows without a line item stay blank
+    mapping = dict(_EMPTY_LINE_MAPPING)
+    total_paid = 0.0
+    for i, line in enumerate(line_items):
+        rate = parse_money(line.get("validated_rate", 0))
+        total_paid += rate
+        # The template only has rows for 6 lines
+        if i >= 6:
+            continue
         modifier_raw = line.get("modifier")
         if isinstance(modifier_raw, list):
             modifier = ",".join([m for m in modifier_raw if m in ACCEPTABLE_MODIFIERS])
@@ -17,48 +53,131 @@ def process_line_items(line_items):
             modifier = ""
         pos = line.get("pos", "11")
         units = line.get("units", 1)
-        try:
-            charge = float(str(line.get("charge", 0)).replace("$", "").replace(",", ""))
-        except Exception:
-            charge = 0.0
-        try:
-            rate = float(str(line.get("validated_rate", 0)).replace("$", "").replace(",", ""))
-        except Exception:
-            rate = 0.0
-        mapping.update({
-            f"<dos{i}>": line.get("date_of_service", ""),
-            f"<cpt{i}>": line.get("cpt", "N/A"),
-            f"<charge{i}>": "${:,.2f}".format(charge),
-            f"<units{i}>": units,
-            f"<modifier{i}>": modifier,
-            f"<pos{i}>": pos,
-            f"<rate{i}>": f"{rate:.2f}",
-            f"<alwd{i}>": "${:,.2f}".format(rate),
-            f"<paid{i}>": "${:,.2f}".format(rate),
-            f"<code{i}>": "85, 125"
-        })
-    for i in range(len(line_items) + 1, 7):
-        mapping.update({
-            f"<dos{i}>": "", f"<cpt{i}>": "", f"<charge{i}>": "", f"<units{i}>": "",
-            f"<modifier{i}>": "", f"<pos{i}>": "", f"<alwd{i}>": "", f"<paid{i}>": "", f"<code{i}>": ""
-        })
-    return mapping
+        charge = parse_money(line.get("charge", 0))
+        keys = _ROW_KEYS[i]
+        mapping[keys["dos"]] = line.get("date_of_service", "")
+        mapping[keys["cpt"]] = line.get("cpt", "N/A")
+        mapping[keys["charge"]] = f"${charge:,.2f}"
+        mapping[keys["units"]] = units
+        mapping[keys["modifier"]] = modifier
+        mapping[keys["pos"]] = pos
+        mapping[keys["rate"]] = f"{rate:.2f}"
+        mapping[keys["alwd"]] = mapping[keys["paid"]] = f"${rate:,.2f}"
+        mapping[keys["code"]] = "85, 125"
+    return mapping, total_paid
+
+# Shape of every template placeholder (<dob>, <billing_address1>, <cpt3>, ...);
+# compiled once and looked up in the mapping, so nothing is built per document
+PLACEHOLDER_RE = re.compile(r"<[A-Za-z_]+\d*>")
+
+@lru_cache(maxsize=8)
+def _placeholder_automaton(keys):
+    """Aho-Corasick automaton over the placeholders (every document uses the same keys)"""
+    automaton = ahocorasick.Automaton()
+    for key in keys:
+        automaton.add_word(key, key)
+    automaton.make_automaton()
+    return automaton
+
+def _automaton_sub(automaton, values, text):
+    """Replace the leftmost-longest placeholder matches in text"""
+    parts = []
+    last = 0
+    for end, key in automaton.iter_long(text):
+        parts.append(text[last:end - len(key) + 1])
+        parts.append(values[key])
+        last = end + 1
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return "".join(parts)
+
+# WordprocessingML tags, in the {namespace}name form lxml uses
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_R, _W_T, _W_HYPERLINK = _W + "p", _W + "r", _W + "t", _W + "hyperlink"
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+def _paragraph_text_nodes(p):
+    """The paragraph's own <w:t> elements (its runs and hyperlink runs, not nested text boxes)"""
+    nodes = []
+    for child in p:
+        if child.tag == _W_R:
+            nodes.extend(child.findall(_W_T))
+        elif child.tag == _W_HYPERLINK:
+            for run in child.findall(_W_R):
+                nodes.extend(run.findall(_W_T))
+    return nodes
+
+def _merge_split_placeholders(texts):
+    """
+    Join each text that ends inside a placeholder with the texts after it up
+    to the placeholder's closing '>'. A '<' with no '>' after it, or whose
+    text up to the '>' isn't PLACEHOLDER_RE-shaped, is literal and left alone.
+    """
+    merged = list(texts)
+    i = 0
+    while i < len(merged):
+        text = merged[i]
+        start = text.rfind("<")
+        if start <= text.rfind(">"):
+            i += 1
+            continue
+        # Find the text holding the next '>' and check what lies between
+        j = i + 1
+        while j < len(merged) and ">" not in merged[j]:
+            j += 1
+        if j == len(merged):
+            i += 1
+            continue
+        candidate = text[start:] + "".join(merged[i + 1:j]) + merged[j][:merged[j].index(">") + 1]
+        if not PLACEHOLDER_RE.fullmatch(candidate):
+            i += 1
+            continue
+        merged[i] = "".join(merged[i:j + 1])
+        merged[i + 1:j + 1] = [""] * (j - i)
+        # The joined text may end inside the next split placeholder; check it again
+    return merged
+
+def _replace_in_paragraph(p, substitute):
+    """
+    Substitute placeholders in a <w:p> element's text nodes in place so each
+    run keeps its formatting; a placeholder split across runs is joined into
+    the first of those runs, leaving the paragraph's other runs untouched
+    """
+    nodes = _paragraph_text_nodes(p)
+    texts = [node.text or "" for node in nodes]
+    text = "".join(texts)
+    # Every placeholder starts with '<'; most paragraphs have none
+    if "<" not in text:
+        return
+    new_text = substitute(text)
+    if new_text == text:
+        return
+    new_texts = [substitute(t) if "<" in t else t for t in texts]
+    if "".join(new_texts) != new_text:
+        merged = _merge_split_placeholders(texts)
+        new_texts = [substitute(t) if "<" in t else t for t in merged]
+    for node, old, new in zip(nodes, texts, new_texts):
+        if new != old:
+            node.text = new
+            if new != new.strip():
+                # Word drops leading/trailing spaces without this
+                node.set(_XML_SPACE, "preserve")
 
 def populate_placeholders(doc, mapping):
     """Replace placeholders in a Word document with values"""
     sanitized_mapping = {k: str(v) if v is not None else "" for k, v in mapping.items()}
-    # Process paragraphs
-    for paragraph in doc.paragraphs:
-        for placeholder, value in sanitized_mapping.items():
-            if placeholder in paragraph.text:
-                paragraph.text = paragraph.text.replace(placeholder, value)
-    # Process tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for placeholder, value in sanitized_mapping.items():
-                    if placeholder in cell.text:
-                        cell.text = cell.text.replace(placeholder, value)
+    # One pass per text node for all placeholders
+    if ahocorasick is not None:
+        automaton = _placeholder_automaton(frozenset(sanitized_mapping))
+        substitute = lambda text: _automaton_sub(automaton, sanitized_mapping, text)
+    else:
+        # Anything placeholder-shaped that isn't in the mapping is left as it is
+        replace = lambda match: sanitized_mapping.get(match.group(0), match.group(0))
+        substitute = lambda text: PLACEHOLDER_RE.sub(replace, text)
+    # One walk over the body XML covers paragraphs and table cells alike
+    for p in doc.element.body.iter(_W_P):
+        _replace_in_paragraph(p, substitute)
 
 def generate_document(record, eobr_data, output_folders):
     """Generate Word document for an EOBR record using adapted record format"""
@@ -93,13 +212,8 @@ def generate_document(record, eobr_data, output_folders):
     else:
         order_no = filemaker_record_number or order_id or "N/A"
 
-    # Total paid: sum validated_rate from line_items
-    total_paid = 0.0
-    for item in line_items:
-        try:
-            total_paid += float(str(item.get("validated_rate", 0)).replace("$", "").replace(",", ""))
-        except Exception:
-            continue
+    # Line placeholders and total paid (sum of validated_rate) in one pass
+    line_mapping, total_paid = process_line_items(line_items)
 
     mapping = {
         "<process_date>": datetime.now().strftime("%Y-%m-%d"),
@@ -116,10 +230,11 @@ def generate_document(record, eobr_data, output_folders):
         "<billing_zip>": billing_zip,
         "<TIN>": tin,
         "<NPI>": npi,
-        "<total_paid>": "${:,.2f}".format(total_paid),
+        "<total_paid>": f"${total_paid:,.2f}",
     }
-    mapping.update(process_line_items(line_items))
-    doc = Document(WORD_TEMPLATE)
+    mapping.update(line_mapping)
+    # Copying the parsed template is over twice as fast as re-reading the .docx
+    doc = copy.deepcopy(_template_document())
     populate_placeholders(doc, mapping)
     eobr_file_name = f"EOBR_{eobr_data['EOBR Number']}"
     docx_output = os.path.join(output_folders['docs'], f"{eobr_file_name}.docx")
@@ -1,14 +1,21 @@
+import logging
 import os
 from pathlib import Path
 from datetime import datetime
 from dateutil.parser import parse
 
-from utils.formatters import format_date_for_eob, calculate_due_date
+from utils.formatters import format_date_for_eob, calculate_due_date, parse_money, fmt_mdy
 
-def collect_additional_eobr_data(record, mapping, historical_duplicates, processed_control_numbers):
+logger = logging.getLogger(__name__)
+
+def collect_additional_eobr_data(record, mapping, historical_duplicates, processed_control_numbers, seen_dup_keys):
     """
     Collect additional data for EOBR record (adapted record format)
     Returns a dictionary with all fields needed for Excel
+
+    processed_control_numbers maps control numbers to their last EOBR serial;
+    seen_dup_keys holds the duplicate keys already issued this run. Both are
+    updated in place.
     """
     # Extract base file name
     full_path = record.get("file_info", {}).get("file_name", "Unknown")
@@ -31,10 +38,13 @@ def collect_additional_eobr_data(record, mapping, historical_duplicates, process
 
     try:
         formatted_date = format_date_for_eob(date_of_service)
-        print(f"Original date: {date_of_service}")
-        print(f"Formatted date: {formatted_date}")
-        bill_date = parse(formatted_date)
-        formatted_bill_date = bill_date.strftime("%m.%d.%Y")
+        logger.debug("Original date: %s, formatted date: %s", date_of_service, formatted_date)
+        # format_date_for_eob returns YYYY-MM-DD, which fromisoformat reads directly
+        try:
+            bill_date = datetime.fromisoformat(formatted_date)
+        except ValueError:
+            bill_date = parse(formatted_date)
+        formatted_bill_date = fmt_mdy(bill_date.date())
         due_date = calculate_due_date(bill_date)
     except Exception as e:
         print(f"Error processing date '{date_of_service}' from file: {base_filename}")
@@ -58,43 +68,45 @@ def collect_additional_eobr_data(record, mapping, historical_duplicates, process
     billing_zip = billing_address.get("Postal_Code", "N/A")
     mailing_address = f"{billing_address1}, {billing_city}, {billing_state} {billing_zip}"
 
-    # CPT codes and duplicate check
-    cpt_list = [line.get('cpt') for line in line_items if line.get('cpt')]
-    duplicate_key = f"{control_number}|{','.join(cpt_list)}"
-    is_duplicate = duplicate_key in historical_duplicates or duplicate_key in processed_control_numbers
+    # CPT codes, Amount and Total in one pass over the line items
+    cpt_list = []
+    amount = 0.0
+    total = 0.0
+    for line in line_items:
+        cpt = line.get('cpt')
+        if cpt:
+            cpt_list.append(cpt)
+        amount += parse_money(line.get('charge', 0))
+        total += parse_money(line.get('validated_rate', 0))
+
+    # Duplicate check
+    cpts = ','.join(cpt_list)
+    duplicate_key = f"{control_number}|{cpts}"
+    is_duplicate = duplicate_key in historical_duplicates or duplicate_key in seen_dup_keys
     release_payment = "N" if is_duplicate else "Y"
-    processed_control_numbers[duplicate_key] = True
+    seen_dup_keys.add(duplicate_key)
 
     # Patient info
     patient_name = patient_info.get("PatientName", "N/A")
 
     # Description field
-    description = f"{date_of_service} {','.join(cpt_list)} {patient_name} {control_number}"
+    description = f"{date_of_service} {cpts} {patient_name} {control_number}"
 
     # Memo field
     memo = f"{date_of_service}, {patient_name}"
 
-    # Amount and Total
-    def safe_float(val):
-        try:
-            return float(str(val).replace("$", "").replace(",", ""))
-        except Exception:
-            return 0.0
-    amount = sum(safe_float(line.get('charge', 0)) for line in line_items)
-    total = sum(safe_float(line.get('validated_rate', 0)) for line in line_items)
-
     # Return data dictionary
     return {
         "EOBR Number": eobr_number,
         "Bill Date": formatted_bill_date,
-        "Due Date": due_date.strftime("%m.%d.%Y"),
+        "Due Date": fmt_mdy(due_date.date()),
         "Vendor": billing_name,
         "Input File": base_filename,
         "Mailing Address": mailing_address,
         "Description": description,
         "Memo": memo,
-        "Amount": "${:,.2f}".format(amount),
-        "Total": "${:,.2f}".format(total),
+        "Amount": f"${amount:,.2f}",
+        "Total": f"${total:,.2f}",
         "Duplicate Check": "Duplicate" if is_duplicate else "Null",
         "Full Duplicate Key": duplicate_key,
         "Release Payment": release_payment,
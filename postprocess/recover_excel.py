@@ -1,13 +1,23 @@
 import os
-from pathlib import Path
 from openpyxl import Workbook, load_workbook
 from config.settings import EXCEL_HEADERS, HISTORICAL_EXCEL_PATH
 import pandas as pd
 import shutil
 from datetime import datetime
 import zipfile
-import tempfile
-import xml.etree.ElementTree as ET
+try:
+    import lxml.etree as ET
+except ImportError:  # the stdlib parser has the same iterparse API
+    import xml.etree.ElementTree as ET
+
+# SpreadsheetML namespace and the tags read during recovery
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+SI = NS + 'si'
+T = NS + 't'
+SHEET_DATA = NS + 'sheetData'
+ROW = NS + 'row'
+C = NS + 'c'
+V = NS + 'v'
 
 def try_recover_excel(corrupted_path):
     """Try to recover data from a corrupted Excel file"""
@@ -27,44 +37,50 @@ def try_recover_excel(corrupted_path):
     # Method 1: Try to extract and parse XML directly
     try:
         print("\nTrying to extract and parse XML directly...")
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Try to extract any readable parts
-            with zipfile.ZipFile(corrupted_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+        # Stream the parts straight out of the archive; only the shared strings
+        # and the current row are ever held in memory
+        with zipfile.ZipFile(corrupted_path, 'r') as zip_ref:
+            names = set(zip_ref.namelist())
             
             # Look for shared strings and sheet data
             shared_strings = {}
             sheet_data = []
             
             # First, try to read shared strings
-            shared_strings_path = Path(temp_dir) / 'xl' / 'sharedStrings.xml'
-            if shared_strings_path.exists():
-                print(f"Found shared strings at: {shared_strings_path}")
-                tree = ET.parse(shared_strings_path)
-                root = tree.getroot()
-                for idx, si in enumerate(root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}si')):
-                    text = si.find('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')
-                    if text is not None:
-                        shared_strings[idx] = text.text
+            if 'xl/sharedStrings.xml' in names:
+                print(f"Found shared strings at: {corrupted_path}!xl/sharedStrings.xml")
+                with zip_ref.open('xl/sharedStrings.xml') as f:
+                    root = None
+                    idx = 0
+                    for event, elem in ET.iterparse(f, events=('start', 'end')):
+                        if root is None:
+                            root = elem
+                        if event == 'end' and elem.tag == SI:
+                            text = elem.find('.//' + T)
+                            if text is not None:
+                                shared_strings[idx] = text.text
+                            idx += 1
+                            # Drop the processed <si> elements
+                            root.clear()
             
             # Then, try to read sheet data
-            sheet_path = Path(temp_dir) / 'xl' / 'worksheets' / 'sheet1.xml'
-            if sheet_path.exists():
-                print(f"Found sheet data at: {sheet_path}")
-                tree = ET.parse(sheet_path)
-                root = tree.getroot()
-                
-                # Get all rows
-                rows = root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row')
-                if rows:
-                    print(f"Found {len(rows)} rows in sheet data")
-                    
-                    # Process each row
-                    for row in rows:
+            if 'xl/worksheets/sheet1.xml' in names:
+                print(f"Found sheet data at: {corrupted_path}!xl/worksheets/sheet1.xml")
+                with zip_ref.open('xl/worksheets/sheet1.xml') as f:
+                    parent = None
+                    for event, elem in ET.iterparse(f, events=('start', 'end')):
+                        if event == 'start':
+                            if elem.tag == SHEET_DATA:
+                                parent = elem
+                            continue
+                        if elem.tag != ROW:
+                            continue
+                        
+                        # Process each row as soon as it has been read
                         row_data = []
-                        cells = row.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}c')
+                        cells = elem.findall(C)
                         for cell in cells:
-                            value = cell.find('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}v')
+                            value = cell.find(V)
                             if value is not None:
                                 cell_value = value.text
                                 # If it's a shared string reference
@@ -76,14 +92,24 @@ def try_recover_excel(corrupted_path):
                         
                         if row_data:
                             sheet_data.append(row_data)
+                        # Drop the processed <row> elements
+                        if parent is not None:
+                            parent.clear()
+                print(f"Found {len(sheet_data)} rows in sheet data")
             
             # If we found data, convert it to the expected format
             if sheet_data:
                 print(f"Successfully extracted {len(sheet_data)} rows of data")
                 headers = sheet_data[0] if sheet_data else []
+                # Source column of each EXCEL_HEADERS field (the last one if a
+                # header repeats), worked out once rather than per row
+                position = {header: i for i, header in enumerate(headers)}
+                columns = [position.get(header) for header in EXCEL_HEADERS]
                 for row in sheet_data[1:]:
-                    row_dict = {headers[i]: value for i, value in enumerate(row)}
-                    recovered_data.append(row_dict)
+                    recovered_data.append([
+                        row[i] if i is not None and i < len(row) else None
+                        for i in columns
+                    ])
     
     except Exception as e:
         print(f"XML extraction method failed: {e}")
@@ -92,18 +118,13 @@ def try_recover_excel(corrupted_path):
     if recovered_data:
         print(f"\nRecovered {len(recovered_data)} rows of data")
         new_path = str(corrupted_path) + ".recovered"
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Recovered Data"
+        # Write-only mode streams rows to disk instead of keeping every cell
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Recovered Data")
         ws.append(EXCEL_HEADERS)
         
         for row in recovered_data:
-            ws.append([
-                row.get("Release Payment"), row.get("Duplicate Check"), row.get("Full Duplicate Key"),
-                row.get("Input File"), row.get("EOBR Number"), row.get("Vendor"), row.get("Mailing Address"),
-                row.get("Terms"), row.get("Bill Date"), row.get("Due Date"), row.get("Category"), row.get("Description"),
-                row.get("Amount"), row.get("Memo"), row.get("Total"),
-            ])
+            ws.append(row)
         
         wb.save(new_path)
         print(f"Saved recovered data to: {new_path}")
@@ -113,7 +134,7 @@ def try_recover_excel(corrupted_path):
 if __name__ == "__main__":
     # Get the path to the corrupted file
     corrupted_path = HISTORICAL_EXCEL_PATH
-    if not Path(corrupted_path).exists():
+    if not corrupted_path.exists():
         print(f"Error: File not found at {corrupted_path}")
     else:
         try_recover_excel(corrupted_path) 
\ No newline at end of file
@@ -1,5 +1,4 @@
 import sqlite3
-from pathlib import Path
 from config.settings import DB_PATH
 
 def reset_payment_fields(line_item_ids):
@@ -9,14 +8,22 @@ def reset_payment_fields(line_item_ids):
     Args:
         line_item_ids (list): List of line item IDs to reset
     """
-    if not Path(DB_PATH).exists():
+    if not DB_PATH.exists():
         print(f"Error: Database file not found at {DB_PATH}")
         return
     
     conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA synchronous = NORMAL")
     cursor = conn.cursor()
     
     try:
+        # Stage the IDs in a temp table so one UPDATE and one SELECT cover any
+        # number of them. line_items stores id as TEXT, so the IDs are too
+        # (which also lets the UPDATE use the id index).
+        cursor.execute("BEGIN")
+        cursor.execute("CREATE TEMP TABLE _reset_ids(id TEXT PRIMARY KEY)")
+        cursor.executemany("INSERT OR IGNORE INTO _reset_ids VALUES (?)", [(line_item_id,) for line_item_id in line_item_ids])
+        
         # Update the line_items table
         cursor.execute('''
         UPDATE line_items SET 
@@ -26,8 +33,8 @@ def reset_payment_fields(line_item_ids):
             HCFA_doc_no = NULL,
             BR_date_processed = NULL,
             updated_at = CURRENT_TIMESTAMP
-        WHERE id IN ({})
-        '''.format(','.join('?' * len(line_item_ids))), line_item_ids)
+        WHERE id IN (SELECT id FROM _reset_ids)
+        ''')
         
         rows_affected = cursor.rowcount
         conn.commit()
@@ -38,10 +45,11 @@ def reset_payment_fields(line_item_ids):
         cursor.execute('''
         SELECT id, Order_ID, CPT, BR_paid, BR_rate, EOBR_doc_no 
         FROM line_items 
-        WHERE id IN ({})
-        '''.format(','.join('?' * len(line_item_ids))), line_item_ids)
-        
+        WHERE id IN (SELECT id FROM _reset_ids)
+        ''')
         rows = cursor.fetchall()
+        cursor.execute("DROP TABLE _reset_ids")
+        
         print("\nUpdated records:")
         for row in rows:
             print(f"  ID: {row[0]}, Order: {row[1]}, CPT: {row[2]}, Paid: {row[3]}, Rate: {row[4]}, EOBR: {row[5]}")
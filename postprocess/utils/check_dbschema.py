@@ -1,6 +1,10 @@
+import atexit
+import io
 import os
 import sqlite3
 import json
+import shlex
+import socket
 import tempfile
 import paramiko
 from datetime import datetime
@@ -13,6 +17,40 @@ REMOTE_DB_PATH = "/srv/bill_review/filemaker.db"
 REMOTE_KEY_PATH = os.path.expanduser("~/.ssh/id_rsa")
 USE_REMOTE_DB = True  # Toggle to use remote or local database
 LOCAL_DB_PATH = "filemaker.db"  # Change this if needed
+SSH_KEEPALIVE = 30  # seconds between keepalives on the reused SSH session
+SFTP_WINDOW_SIZE = 2 * 1024 * 1024  # SSH channel window for the SFTP channel
+SFTP_MAX_PACKET = 256 * 1024  # Largest SSH packet on the SFTP channel
+SFTP_MAX_REQUESTS = 64  # Outstanding SFTP read requests while downloading the DB
+SQLITE_CACHE_KB = 256 * 1024  # Page cache for the analysis connection
+SQLITE_MMAP_SIZE = 1024 * 1024 * 1024  # Bytes of the database file memory-mapped
+
+_SSH = None  # SSH session shared by the download and the remote queries
+
+def _get_ssh():
+    """Return the shared SSH session, (re)connecting it if needed"""
+    global _SSH
+    transport = _SSH.get_transport() if _SSH is not None else None
+    if transport is None or not transport.is_active():
+        if _SSH is not None:
+            _SSH.close()
+        _SSH = paramiko.SSHClient()
+        _SSH.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Send small SFTP requests and acks at once rather than waiting on
+        # Nagle; buffer sizes are left to the kernel's autotuning
+        sock = socket.create_connection((REMOTE_HOST, 22))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _SSH.connect(REMOTE_HOST, username=REMOTE_USER, key_filename=REMOTE_KEY_PATH, sock=sock)
+        _SSH.get_transport().set_keepalive(SSH_KEEPALIVE)
+    return _SSH
+
+def close_ssh():
+    """Close the shared SSH session"""
+    global _SSH
+    if _SSH is not None:
+        _SSH.close()
+        _SSH = None
+
+atexit.register(close_ssh)
 
 def get_db_connection():
     """Get database connection (local or remote)"""
@@ -21,6 +59,15 @@ def get_db_connection():
     else:
         return get_local_db_connection()
 
+def _tune_conn(conn):
+    """Set up a connection for the read-only analysis queries"""
+    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    # Keep the scans' pages cached and mapped, and sort/group in memory
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
 def get_local_db_connection():
     """Get a connection to the local database"""
     if not Path(LOCAL_DB_PATH).exists():
@@ -28,56 +75,152 @@ def get_local_db_connection():
         return None, None
     
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        conn = _tune_conn(sqlite3.connect(LOCAL_DB_PATH))
         return conn, LOCAL_DB_PATH
     except Exception as e:
         print(f"Error connecting to local database: {e}")
         return None, None
 
 def get_remote_db_connection():
-    """Create an SSH tunnel and connect to the remote database"""
+    """
+    Create an SSH tunnel and connect to a copy of the remote database
+    
+    Returns:
+        tuple: (connection, temp file path), the path None when the copy is
+        held in memory; (None, None) on failure
+    """
     try:
-        # Create a temporary file to hold the database
-        temp_db = tempfile.NamedTemporaryFile(delete=False)
-        temp_db.close()
-        
-        # Setup SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
         # Connect to the remote server
         try:
-            ssh.connect(REMOTE_HOST, username=REMOTE_USER, key_filename=REMOTE_KEY_PATH)
+            ssh = _get_ssh()
         except Exception as e:
             print(f"SSH connection error: {e}")
-            if os.path.exists(temp_db.name):
-                os.unlink(temp_db.name)
             return None, None
         
-        # Copy the remote database file to local temp file
-        sftp = ssh.open_sftp()
-        sftp.get(REMOTE_DB_PATH, temp_db.name)
-        sftp.close()
-        ssh.close()
+        # Copy the remote database file over an SFTP channel with a wider
+        # window/bigger packets than open_sftp()'s defaults so more of the
+        # database is in flight on high-latency links
+        sftp = paramiko.SFTPClient.from_transport(
+            ssh.get_transport(), window_size=SFTP_WINDOW_SIZE, max_packet_size=SFTP_MAX_PACKET
+        )
+        # Stream it with many reads in flight at once rather than one round
+        # trip per 32 KB block; into memory where sqlite3 can open it from
+        # there (Python 3.11+), otherwise into a temp file
+        if hasattr(sqlite3.Connection, "deserialize"):
+            buf = io.BytesIO()
+            try:
+                sftp.getfo(REMOTE_DB_PATH, buf, max_concurrent_prefetch_requests=SFTP_MAX_REQUESTS)
+            finally:
+                sftp.close()
+            
+            conn = sqlite3.connect(":memory:")
+            conn.deserialize(buf.getbuffer())
+            return _tune_conn(conn), None
+        
+        temp_db = tempfile.NamedTemporaryFile(delete=False)
+        try:
+            sftp.getfo(REMOTE_DB_PATH, temp_db, max_concurrent_prefetch_requests=SFTP_MAX_REQUESTS)
+        finally:
+            sftp.close()
+            temp_db.close()
         
         # Connect to the copied database
-        conn = sqlite3.connect(temp_db.name)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        conn = _tune_conn(sqlite3.connect(temp_db.name))
         return conn, temp_db.name
     except Exception as e:
         print(f"Error connecting to remote database: {e}")
         # Clean up if possible
-        if 'temp_db' in locals() and os.path.exists(temp_db.name):
-            os.unlink(temp_db.name)
+        if 'temp_db' in locals():
+            temp_db.close()
+            if os.path.exists(temp_db.name):
+                os.unlink(temp_db.name)
         return None, None
 
-def analyze_database():
-    """Analyze the database and return information needed for updates"""
-    conn, db_path = get_db_connection()
-    if not conn:
-        return {"error": "Failed to connect to database"}
+# Every query analyze_database needs, so a remote run can send them as one
+# sqlite3 script; those on a missing table or column come back empty
+ANALYSIS_QUERIES = [
+    ("tables", "SELECT name FROM sqlite_master WHERE type='table'"),
+    ("orders_columns", "PRAGMA table_info(orders)"),
+    ("orders_count", "SELECT COUNT(*) as count FROM orders"),
+    ("line_items_columns", "PRAGMA table_info(line_items)"),
+    ("line_items_count", "SELECT COUNT(*) as count FROM line_items"),
+    ("paid_count", "SELECT COUNT(*) as count FROM line_items WHERE BR_paid IS NOT NULL"),
+    ("orders_with_payments", """
+        SELECT Order_ID, COUNT(*) as total_items, 
+        SUM(CASE WHEN BR_paid IS NOT NULL THEN 1 ELSE 0 END) as paid_items 
+        FROM line_items 
+        GROUP BY Order_ID
+        HAVING paid_items > 0
+    """),
+    ("sample_paid_items", """
+        SELECT * FROM line_items 
+        WHERE BR_paid IS NOT NULL 
+        ORDER BY BR_date_processed DESC
+        LIMIT 5
+    """),
+]
+SECTION_MARKER = "@@section "
+
+def run_remote_queries():
+    """
+    Run ANALYSIS_QUERIES with sqlite3 on the server in one SSH round trip,
+    so only the result rows cross the network instead of the whole database
+    
+    Returns:
+        dict or None: Query name -> list of row dicts, None if the script
+        failed on the server (sqlite3 missing, older than 3.33 so without
+        JSON output, or a query erroring) and the database must be
+        downloaded instead
+    """
+    script = [".mode json"]
+    for name, sql in ANALYSIS_QUERIES:
+        script.append(f".print {SECTION_MARKER}{name}")
+        script.append(sql.strip() + ";")
     
+    # -bail stops at the first error so a failure shows in the exit status
+    stdin, stdout, stderr = _get_ssh().exec_command(f"sqlite3 -bail {shlex.quote(REMOTE_DB_PATH)}")
+    stdin.write("\n".join(script) + "\n")
+    stdin.channel.shutdown_write()
+    output = stdout.read().decode()
+    errors = stderr.read().decode(errors="replace").strip()
+    if stdout.channel.recv_exit_status() != 0 or errors:
+        print(f"Remote sqlite3 failed: {errors or 'non-zero exit status'}")
+        return None
+    
+    # Split the output on the markers; a query with no rows prints nothing
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith(SECTION_MARKER):
+            current = line[len(SECTION_MARKER):]
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    if "tables" not in sections:
+        return None
+    
+    try:
+        return {name: json.loads("".join(lines)) if lines else [] for name, lines in sections.items()}
+    except ValueError:
+        return None
+
+def run_local_queries(conn):
+    """
+    Run ANALYSIS_QUERIES on an open connection
+    
+    Returns:
+        dict: Query name -> list of row dicts
+    """
+    query_results = {}
+    for name, sql in ANALYSIS_QUERIES:
+        try:
+            query_results[name] = [dict(row) for row in conn.execute(sql).fetchall()]
+        except sqlite3.OperationalError:
+            query_results[name] = []
+    return query_results
+
+def summarize_analysis(query_results):
+    """Build the analysis results from the ANALYSIS_QUERIES rows"""
     results = {
         "tables": {},
         "payment_stats": {},
@@ -85,79 +228,73 @@ def analyze_database():
         "timestamp": datetime.now().isoformat()
     }
     
-    try:
-        # Get list of all tables
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row['name'] for row in cursor.fetchall()]
-        results["tables_list"] = tables
+    # Get list of all tables
+    tables = [row['name'] for row in query_results["tables"]]
+    results["tables_list"] = tables
+    
+    # Check orders table schema
+    if "orders" in tables:
+        columns = {row['name']: row for row in query_results["orders_columns"]}
+        results["tables"]["orders"] = {"columns": columns}
         
-        # Check orders table schema
-        if "orders" in tables:
-            cursor.execute("PRAGMA table_info(orders)")
-            columns = {row['name']: dict(row) for row in cursor.fetchall()}
-            results["tables"]["orders"] = {"columns": columns}
-            
-            # Check if BILLS_PAID field already exists
-            if "BILLS_PAID" in columns:
-                results["schema_needs_update"] = False
-            
-            # Count orders
-            cursor.execute("SELECT COUNT(*) as count FROM orders")
-            results["tables"]["orders"]["count"] = cursor.fetchone()['count']
+        # Check if BILLS_PAID field already exists
+        if "BILLS_PAID" in columns:
+            results["schema_needs_update"] = False
         
-        # Check line_items table schema
-        if "line_items" in tables:
-            cursor.execute("PRAGMA table_info(line_items)")
-            columns = {row['name']: dict(row) for row in cursor.fetchall()}
-            results["tables"]["line_items"] = {"columns": columns}
-            
-            # Count line items
-            cursor.execute("SELECT COUNT(*) as count FROM line_items")
-            results["tables"]["line_items"]["count"] = cursor.fetchone()['count']
-            
-            # Check for payment fields
-            payment_fields = [col for col in columns.keys() if 'paid' in col.lower() or 'payment' in col.lower()]
-            results["tables"]["line_items"]["payment_fields"] = payment_fields
-            
-            # Count line items with payments
-            if "BR_paid" in columns:
-                cursor.execute("SELECT COUNT(*) as count FROM line_items WHERE BR_paid IS NOT NULL")
-                results["payment_stats"]["line_items_with_payments"] = cursor.fetchone()['count']
-            
-            # Get stats by order
-            cursor.execute("""
-                SELECT Order_ID, COUNT(*) as total_items, 
-                SUM(CASE WHEN BR_paid IS NOT NULL THEN 1 ELSE 0 END) as paid_items 
-                FROM line_items 
-                GROUP BY Order_ID
-                HAVING paid_items > 0
-            """)
-            
-            orders_with_payments = []
-            for row in cursor.fetchall():
-                orders_with_payments.append(dict(row))
-            
-            results["payment_stats"]["orders_with_payments"] = orders_with_payments
-            results["payment_stats"]["orders_with_payments_count"] = len(orders_with_payments)
+        # Count orders
+        results["tables"]["orders"]["count"] = query_results["orders_count"][0]['count']
+    
+    # Check line_items table schema
+    if "line_items" in tables:
+        columns = {row['name']: row for row in query_results["line_items_columns"]}
+        results["tables"]["line_items"] = {"columns": columns}
         
-        # Sample some paid line items
-        if "line_items" in tables and results["payment_stats"].get("line_items_with_payments", 0) > 0:
-            cursor.execute("""
-                SELECT * FROM line_items 
-                WHERE BR_paid IS NOT NULL 
-                ORDER BY BR_date_processed DESC
-                LIMIT 5
-            """)
-            
-            sample_paid_items = []
-            for row in cursor.fetchall():
-                sample_paid_items.append(dict(row))
-            
-            results["payment_stats"]["sample_paid_items"] = sample_paid_items
+        # Count line items
+        results["tables"]["line_items"]["count"] = query_results["line_items_count"][0]['count']
+        
+        # Check for payment fields
+        payment_fields = [col for col in columns.keys() if 'paid' in col.lower() or 'payment' in col.lower()]
+        results["tables"]["line_items"]["payment_fields"] = payment_fields
         
+        # Count line items with payments
+        if "BR_paid" in columns:
+            results["payment_stats"]["line_items_with_payments"] = query_results["paid_count"][0]['count']
+        
+        # Get stats by order
+        orders_with_payments = query_results["orders_with_payments"]
+        results["payment_stats"]["orders_with_payments"] = orders_with_payments
+        results["payment_stats"]["orders_with_payments_count"] = len(orders_with_payments)
+    
+    # Sample some paid line items
+    if "line_items" in tables and results["payment_stats"].get("line_items_with_payments", 0) > 0:
+        results["payment_stats"]["sample_paid_items"] = query_results["sample_paid_items"]
+    
+    return results
+
+def analyze_database():
+    """Analyze the database and return information needed for updates"""
+    if USE_REMOTE_DB:
+        # Query the server in place; download the database only if it can't
+        try:
+            query_results = run_remote_queries()
+        except Exception as e:
+            print(f"SSH connection error: {e}")
+            return {"error": "Failed to connect to database"}
+        if query_results is not None:
+            try:
+                return summarize_analysis(query_results)
+            except Exception as e:
+                return {"error": f"Error analyzing database: {str(e)}"}
+        print("Downloading the database to analyze it locally instead")
+    
+    conn, db_path = get_db_connection()
+    if not conn:
+        return {"error": "Failed to connect to database"}
+    
+    try:
+        results = summarize_analysis(run_local_queries(conn))
     except Exception as e:
-        results["error"] = f"Error analyzing database: {str(e)}"
+        results = {"error": f"Error analyzing database: {str(e)}"}
     finally:
         conn.close()
         
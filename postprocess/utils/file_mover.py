@@ -1,35 +1,38 @@
 import os
 import sys
 import logging
-from typing import List, Tuple, Optional, Dict, Any
+from typing import Iterable, Tuple, Optional, Dict, Any
 
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 
-from utils.s3_utils import list_objects, move_with_confirmation
+from utils.s3_utils import list_objects, move_keys, MOVE_WORKERS, LIST_CACHE_TTL
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 class FileMover:
-    def __init__(self, source_dir: str, dest_dir: str):
+    def __init__(self, source_dir: str, dest_dir: str, max_workers: int = MOVE_WORKERS):
         """
         Initialize the FileMover with source and destination directories.
         
         Args:
             source_dir (str): Source directory path
             dest_dir (str): Destination directory path
+            max_workers (int): Number of files moved concurrently
         """
         self.source_dir = source_dir.rstrip('/')
         self.dest_dir = dest_dir.rstrip('/')
+        self.max_workers = max_workers
         
-    def move_files(self, file_list: List[str], verify_only_basename: bool = True) -> Dict[str, Any]:
+    def move_files(self, file_list: Iterable[str], verify_only_basename: bool = True) -> Dict[str, Any]:
         """
         Move files from source to destination directory.
         
         Args:
-            file_list (List[str]): List of files to move (can be basenames or full paths)
+            file_list (Iterable[str]): Files to move (can be basenames or full paths);
+                consumed lazily, so moves start while it is still being read
             verify_only_basename (bool): If True, matches only file basenames against source files
             
         Returns:
@@ -39,42 +42,34 @@ class FileMover:
                 - summary: Dict with count statistics
         """
         # Get all files in the source directory
-        source_files = list_objects(self.source_dir)
+        source_files = list_objects(self.source_dir, max_age=LIST_CACHE_TTL)
         
-        # Filter for files that are in our list
-        if verify_only_basename:
-            files_to_process = [f for f in source_files 
-                              if os.path.basename(f) in [os.path.basename(x) for x in file_list]]
-        else:
-            files_to_process = [f for f in source_files if f in file_list]
+        # Index the source files by the name they're requested under, so each
+        # requested file is one lookup
+        by_name = {}
+        for f in source_files:
+            by_name.setdefault(os.path.basename(f) if verify_only_basename else f, []).append(f)
         
-        moved_files = []
-        failed_files = []
+        total_requested = 0
+        submitted = set()
         
-        for file_key in files_to_process:
-            try:
-                # Construct destination key
-                dest_key = file_key.replace(self.source_dir, self.dest_dir)
-                
-                # Move the file with confirmation
-                success, result = move_with_confirmation(file_key, dest_key)
-                
-                if success:
-                    moved_files.append(file_key)
-                    logger.info(f"Moved: {file_key} -> {dest_key}")
-                else:
-                    error_msg = result.get('error', 'Unknown error')
-                    logger.error(f"Failed to move {file_key}: {error_msg}")
-                    failed_files.append((file_key, error_msg))
-                
-            except Exception as e:
-                logger.error(f"Failed to move {file_key}: {str(e)}")
-                failed_files.append((file_key, str(e)))
+        def pairs():
+            nonlocal total_requested
+            for requested in file_list:
+                total_requested += 1
+                name = os.path.basename(requested) if verify_only_basename else requested
+                for file_key in by_name.get(name, ()):
+                    if file_key not in submitted:
+                        submitted.add(file_key)
+                        yield file_key, file_key.replace(self.source_dir, self.dest_dir)
+        
+        moved, failed_files = move_keys(pairs(), self.max_workers)
+        moved_files = [file_key for file_key, _ in moved]
         
         # Prepare summary
         summary = {
-            'total_requested': len(file_list),
-            'total_found': len(files_to_process),
+            'total_requested': total_requested,
+            'total_found': len(submitted),
             'successfully_moved': len(moved_files),
             'failed_moves': len(failed_files)
         }
@@ -109,9 +104,9 @@ class FileMover:
         """
         try:
             with open(csv_path, 'r') as f:
-                files_to_move = [line.strip() for line in f if line.strip()]
-            
-            return self.move_files(files_to_move)
+                # One file per line, read as the moves are submitted
+                files_to_move = (line.strip() for line in f if line.strip())
+                return self.move_files(files_to_move)
             
         except Exception as e:
             logger.error(f"Error reading CSV file {csv_path}: {str(e)}")
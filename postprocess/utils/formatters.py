@@ -1,4 +1,6 @@
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from dateutil.parser import parse
 import holidays
 
@@ -12,34 +14,120 @@ def format_date_for_eob(date_str):
             # Just take the first date in the range
             date_str = date_str.split(" - ")[0]
         
-        date_obj = parse(date_str)
-        return date_obj.strftime("%Y-%m-%d")
+        return _eob_date(date_str)
     except Exception as e:
         print(f"Error parsing date '{date_str}': {e}")
         # Return a safe default if parsing fails
         return datetime.now().strftime("%Y-%m-%d")
 
+# Common formats tried with strptime before dateutil's much slower parser,
+# each with the year range where both agree (strptime takes %Y from short
+# years and pivots %y at 1969; dateutil doesn't)
+_DATE_FORMATS = (
+    ("%Y-%m-%d", 1000, 10000),
+    ("%m/%d/%Y", 1000, 10000),
+    ("%m/%d/%y", 2000, 2069),
+    ("%Y/%m/%d", 1000, 10000),
+)
+
+def _parse_date(date_str):
+    """dateutil's parse(), trying strptime with the common formats first"""
+    for fmt, min_year, max_year in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+        if min_year <= parsed.year < max_year:
+            return parsed
+    return parse(date_str)
+
+@lru_cache(maxsize=4096)
+def _eob_date(date_str):
+    """Parse a date string to YYYY-MM-DD; memoized, and failures raise so they aren't cached"""
+    return _parse_date(date_str).strftime("%Y-%m-%d")
+
+@lru_cache(maxsize=1024)
+def fmt_mdy(d):
+    """Format a date as MM.DD.YYYY; memoized, since bill and due dates repeat across records"""
+    return d.strftime("%m.%d.%Y")
+
 def format_date(date_str):
     """General date formatter"""
     if not date_str:
         return ""
     try:
-        date_obj = parse(date_str)
-        return date_obj.strftime("%Y-%m-%d")
+        return _eob_date(date_str)
     except Exception:
         return date_str  # Return original if parsing fails
 
+# Drops "$" and "," in a single pass
+_MONEY_STRIP = str.maketrans("", "", "$,")
+
+@lru_cache(maxsize=8192)
+def _parse_money_str(value):
+    """parse_money() for strings, memoized"""
+    try:
+        return float(value.translate(_MONEY_STRIP))
+    except Exception:
+        return 0.0
+
+def parse_money(value):
+    """
+    Parse a "$1,250.00"-style amount (or a plain number) to a float
+    
+    Strings are memoized, since the same charges and rates repeat across bills.
+    
+    Returns:
+        float: The amount, 0.0 if it isn't a number
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return _parse_money_str(str(value))
+
 def format_currency(amount):
     """Format amount as currency"""
-    return "${:,.2f}".format(float(amount))
+    return f"${float(amount):,.2f}"
+
+DUE_BUSINESS_DAYS = 45
+HOLIDAY_YEARS = [2021, 2022, 2023, 2024, 2025]
+
+@lru_cache(maxsize=None)
+def _holiday_ordinals(year):
+    """
+    Sorted ordinals of the weekday US holidays for HOLIDAY_YEARS plus year and
+    the year after - every year a due date starting in year can reach
+    """
+    us_holidays = holidays.US(years=sorted(set(HOLIDAY_YEARS) | {year, year + 1}))
+    return sorted(day.toordinal() for day in us_holidays if day.weekday() < 5)
+
+def _add_weekdays(ordinal, count):
+    """Day ordinal that is count weekdays after ordinal"""
+    if not count:
+        return ordinal
+    # Count from the Friday on or before the start; weekend starts land the same
+    weekday = (ordinal - 1) % 7  # date.weekday() of the ordinal
+    if weekday > 4:
+        ordinal -= weekday - 4
+        weekday = 4
+    full_weeks, rem = divmod(count, 5)
+    ordinal += 7 * full_weeks
+    # The remaining 0-4 weekdays, stepping over one weekend if they cross it
+    ordinal += rem + (2 if weekday + rem > 4 else 0)
+    return ordinal
+
+@lru_cache(maxsize=4096)
+def _due_offset(bill_ordinal):
+    """Calendar days from the bill date to its due date; memoized by day"""
+    holiday_ordinals = _holiday_ordinals(date.fromordinal(bill_ordinal).year)
+    due = _add_weekdays(bill_ordinal, DUE_BUSINESS_DAYS)
+    start = bill_ordinal
+    # Each weekday holiday passed over pushes the due date one weekday out
+    while True:
+        skipped = bisect_right(holiday_ordinals, due) - bisect_right(holiday_ordinals, start)
+        if not skipped:
+            return due - bill_ordinal
+        start, due = due, _add_weekdays(due, skipped)
 
 def calculate_due_date(bill_date):
     """Calculate due date based on bill date (45 business days)"""
-    us_holidays = holidays.US(years=[2021, 2022, 2023, 2024, 2025])
-    due_date = bill_date
-    days_added = 0
-    while days_added < 45:
-        due_date += timedelta(days=1)
-        if due_date.weekday() < 5 and due_date not in us_holidays:
-            days_added += 1
-    return due_date
\ No newline at end of file
+    return bill_date + timedelta(days=_due_offset(bill_date.toordinal()))
\ No newline at end of file
@@ -8,7 +8,7 @@ import json
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 
-from utils.s3_utils import list_objects, move_with_confirmation, get_s3_json, upload_json_to_s3, delete
+from utils.s3_utils import list_objects, move_keys, MOVE_WORKERS, LIST_CACHE_TTL, get_s3_json, upload_json_to_s3, delete
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,12 +19,13 @@ READY_DIR = 'data/hcfa_json/readyforprocess/'
 FAILS_DIR = 'data/hcfa_json/readyforprocess/fails/'
 LOCAL_DATA_DIR = os.path.join(project_root, 'data')
 
-def move_fails_back(files: List[str] = None) -> Dict[str, Any]:
+def move_fails_back(files: List[str] = None, max_workers: int = MOVE_WORKERS) -> Dict[str, Any]:
     """
     Move files from the fails directory back to readyforprocess.
     
     Args:
         files: Optional list of specific files to move. If None, moves all files.
+        max_workers: Number of files moved concurrently
         
     Returns:
         Dict with summary of the operation
@@ -38,7 +39,7 @@ def move_fails_back(files: List[str] = None) -> Dict[str, Any]:
     
     try:
         # List all files in the fails directory
-        files_to_move = files if files else list_objects(FAILS_DIR)
+        files_to_move = files if files else list_objects(FAILS_DIR, max_age=LIST_CACHE_TTL)
         if not files_to_move:
             logger.info(f"No files found in {FAILS_DIR}")
             return results
@@ -49,34 +50,17 @@ def move_fails_back(files: List[str] = None) -> Dict[str, Any]:
         results['total_files'] = len(files_to_move)
         logger.info(f"Found {len(files_to_move)} files to move back")
         
-        # Move each file
-        for file_key in files_to_move:
-            # Skip if it's a directory marker
-            if file_key.endswith('/'):
-                continue
-                
-            # Create the target key by replacing the fails directory with ready directory
-            target_key = file_key.replace(FAILS_DIR, READY_DIR)
-            
-            try:
-                success, move_result = move_with_confirmation(file_key, target_key)
-                if success:
-                    results['successful_moves'] += 1
-                    logger.info(f"Successfully moved {file_key} to {target_key}")
-                else:
-                    results['failed_moves'] += 1
-                    results['errors'].append({
-                        'file': file_key,
-                        'error': move_result.get('error', 'Unknown error')
-                    })
-                    logger.error(f"Failed to move {file_key}: {move_result.get('error')}")
-            except Exception as e:
-                results['failed_moves'] += 1
-                results['errors'].append({
-                    'file': file_key,
-                    'error': str(e)
-                })
-                logger.error(f"Error moving {file_key}: {str(e)}")
+        # Directory markers stay where they are; the target key swaps the
+        # source directory for the target directory
+        pairs = (
+            (file_key, file_key.replace(FAILS_DIR, READY_DIR))
+            for file_key in files_to_move
+            if not file_key.endswith('/')
+        )
+        moved, failed = move_keys(pairs, max_workers)
+        results['successful_moves'] = len(moved)
+        results['failed_moves'] = len(failed)
+        results['errors'].extend({'file': file_key, 'error': error} for file_key, error in failed)
         
         # If we moved all files successfully, delete the local summary.json
         if results['successful_moves'] == results['total_files']:
@@ -102,10 +86,11 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='Move files from fails directory back to readyforprocess')
     parser.add_argument('files', nargs='*', help='Specific files to move. If not provided, moves all files.')
+    parser.add_argument('--workers', type=int, default=MOVE_WORKERS, help=f'Files moved concurrently (default: {MOVE_WORKERS})')
     args = parser.parse_args()
     
     logger.info("Starting to move files back from fails directory...")
-    results = move_fails_back(args.files)
+    results = move_fails_back(args.files, args.workers)
     
     logger.info("\nMove operation summary:")
     logger.info(f"Total files found: {results['total_files']}")
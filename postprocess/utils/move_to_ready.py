@@ -7,7 +7,7 @@ from typing import List
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 
-from utils.s3_utils import list_objects, move_with_confirmation
+from utils.s3_utils import list_objects, move_keys, MOVE_WORKERS, LIST_CACHE_TTL
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,10 +19,13 @@ SOURCE_DIR = 'data/hcfa_json/valid/mapped/staging/success/'
 # Target directory
 TARGET_DIR = 'data/hcfa_json/readyforprocess/'
 
-def move_files_to_ready() -> dict:
+def move_files_to_ready(max_workers: int = MOVE_WORKERS) -> dict:
     """
     Move files from the source directory to the readyforprocess directory.
     
+    Args:
+        max_workers: Number of files moved concurrently
+        
     Returns:
         dict: Summary of the operation including counts and any errors
     """
@@ -35,7 +38,7 @@ def move_files_to_ready() -> dict:
     
     try:
         # List all files in the source directory
-        files = list_objects(SOURCE_DIR)
+        files = list_objects(SOURCE_DIR, max_age=LIST_CACHE_TTL)
         if not files:
             logger.info(f"No files found in {SOURCE_DIR}")
             return results
@@ -43,34 +46,17 @@ def move_files_to_ready() -> dict:
         logger.info(f"Found {len(files)} files in {SOURCE_DIR}")
         results['total_files'] = len(files)
         
-        # Move each file to the target directory
-        for file_key in files:
-            # Skip if it's a directory marker
-            if file_key.endswith('/'):
-                continue
-                
-            # Create the target key by replacing the source directory with the target directory
-            target_key = file_key.replace(SOURCE_DIR, TARGET_DIR)
-            
-            try:
-                success, move_result = move_with_confirmation(file_key, target_key)
-                if success:
-                    results['successful_moves'] += 1
-                    logger.info(f"Successfully moved {file_key} to {target_key}")
-                else:
-                    results['failed_moves'] += 1
-                    results['errors'].append({
-                        'file': file_key,
-                        'error': move_result.get('error', 'Unknown error')
-                    })
-                    logger.error(f"Failed to move {file_key}: {move_result.get('error')}")
-            except Exception as e:
-                results['failed_moves'] += 1
-                results['errors'].append({
-                    'file': file_key,
-                    'error': str(e)
-                })
-                logger.error(f"Error moving {file_key}: {str(e)}")
+        # Directory markers stay where they are; the target key swaps the
+        # source directory for the target directory
+        pairs = (
+            (file_key, file_key.replace(SOURCE_DIR, TARGET_DIR))
+            for file_key in files
+            if not file_key.endswith('/')
+        )
+        moved, failed = move_keys(pairs, max_workers)
+        results['successful_moves'] = len(moved)
+        results['failed_moves'] = len(failed)
+        results['errors'].extend({'file': file_key, 'error': error} for file_key, error in failed)
                 
     except Exception as e:
         logger.error(f"Error processing directory {SOURCE_DIR}: {str(e)}")
@@ -82,8 +68,14 @@ def move_files_to_ready() -> dict:
     return results
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Move files from staging/success to readyforprocess')
+    parser.add_argument('--workers', type=int, default=MOVE_WORKERS, help=f'Files moved concurrently (default: {MOVE_WORKERS})')
+    args = parser.parse_args()
+    
     logger.info("Starting file move operation...")
-    results = move_files_to_ready()
+    results = move_files_to_ready(args.workers)
     
     logger.info("\nMove operation summary:")
     logger.info(f"Total files found: {results['total_files']}")
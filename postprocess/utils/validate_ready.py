@@ -474,7 +474,7 @@ def validate_ready_files(test_files: List[str] = None) -> Dict[str, Any]:
 
                         # Move to EOBR_ready
                         target_key = file_key.replace(READY_DIR, EOBR_READY_DIR)
-                        upload_json_to_s3(original_data, target_key)
+                        upload_json_to_s3(original_data, target_key, metadata={'status': 'PASS'})
                         delete(file_key)
                         
                         file_results['moved'] = True
@@ -7,8 +7,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-# Import the required modules
-from portal.views.processing import assign_rates, get_cpt_codes_by_category
+# The postprocess scripts import their modules (config, data, processors,
+# utils) relative to the postprocess directory
+sys.path.append(str(project_root / 'postprocess'))
 
 # Common fixtures that can be used across test files
 @pytest.fixture
@@ -0,0 +1,417 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+
+import pytest
+
+from data import db_manager
+
+
+def create_filemaker_db(path):
+    """A small filemaker.db with the columns the payment helpers touch"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE orders (Order_ID TEXT, BILLS_PAID TEXT);
+        CREATE TABLE line_items (
+            id TEXT, Order_ID TEXT, CPT TEXT, BR_paid TEXT, BR_rate REAL,
+            EOBR_doc_no TEXT, HCFA_doc_no TEXT, BR_date_processed TEXT, updated_at TEXT
+        );
+        INSERT INTO orders VALUES ('ORD1', NULL), ('ORD2', '1');
+        INSERT INTO line_items (id, Order_ID, CPT) VALUES ('1', 'ORD1', '70551'), ('2', 'ORD1', '71045'), ('3', 'ORD2', '72125');
+    """)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def remote_db(tmp_path, monkeypatch):
+    """
+    Run db_manager in remote mode against a file standing in for the server's
+    copy. Uploads are recorded instead of sent; yields the list of uploaded
+    file paths (each copied aside as it is "uploaded").
+    """
+    db_path = tmp_path / 'downloaded.db'
+    create_filemaker_db(db_path)
+    uploads = []
+
+    def fake_download():
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        return conn, str(db_path)
+
+    def fake_upload(path):
+        copy = tmp_path / f'upload{len(uploads)}.db'
+        copy.write_bytes(open(path, 'rb').read())
+        uploads.append(copy)
+        return True
+
+    monkeypatch.setattr(db_manager, 'USE_REMOTE_DB', True)
+    monkeypatch.setattr(db_manager, 'USE_REMOTE_SQL', False)
+    monkeypatch.setattr(db_manager, 'get_remote_db_connection', fake_download)
+    monkeypatch.setattr(db_manager, 'push_db_changes_to_remote', fake_upload)
+    monkeypatch.setattr(db_manager, '_cleanup', lambda path: None)
+    yield uploads
+    db_manager.close_db()
+    db_manager._CHANGELOG.clear()
+
+
+class LocalChannel:
+    """The bits of a paramiko channel _run_remote_sql() uses, over a local process"""
+
+    def __init__(self, process):
+        self.process = process
+
+    def shutdown_write(self):
+        self.process.stdin.close()
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+
+class LocalStream:
+    """One of exec_command()'s stdin/stdout/stderr, over a local process pipe"""
+
+    def __init__(self, process, pipe):
+        self.channel = LocalChannel(process)
+        self.pipe = pipe
+
+    def write(self, data):
+        self.pipe.write(data.encode() if isinstance(data, str) else data)
+
+    def read(self):
+        return self.pipe.read()
+
+
+class LocalSSH:
+    """Runs exec_command() locally, so sqlite3 commands hit a local file"""
+
+    def __init__(self):
+        self.commands = []
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        process = subprocess.Popen(
+            command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        return (
+            LocalStream(process, process.stdin),
+            LocalStream(process, process.stdout),
+            LocalStream(process, process.stderr),
+        )
+
+
+@pytest.fixture
+def remote_sql(tmp_path, monkeypatch):
+    """
+    Run db_manager with CDX_REMOTE_SQL=1 against a local file standing in for
+    the server's database (needs the sqlite3 CLI). Downloading it fails the
+    test; yields (path of the "server" database, the fake SSH session).
+    """
+    if shutil.which('sqlite3') is None:
+        pytest.skip('sqlite3 CLI not installed')
+    server_db = tmp_path / 'server.db'
+    create_filemaker_db(server_db)
+    ssh = LocalSSH()
+
+    def no_download():
+        raise AssertionError("remote database was downloaded")
+
+    monkeypatch.setattr(db_manager, 'USE_REMOTE_DB', True)
+    monkeypatch.setattr(db_manager, 'USE_REMOTE_SQL', True)
+    monkeypatch.setattr(db_manager, 'REMOTE_DB_PATH', str(server_db))
+    monkeypatch.setattr(db_manager, '_get_ssh', lambda: ssh)
+    monkeypatch.setattr(db_manager, 'get_remote_db_connection', no_download)
+    db_manager.forget_cached_reads()
+    yield server_db, ssh
+    db_manager.forget_cached_reads()
+    db_manager.close_db()
+
+
+class TestRemoteSQL:
+    """CDX_REMOTE_SQL=1 answering from the server without downloading the database"""
+
+    def test_initialize_does_not_download(self, remote_sql):
+        """The startup check runs on the server, so later helpers still take the remote path"""
+        server_db, ssh = remote_sql
+
+        assert db_manager.initialize_database()
+        assert db_manager._CONN is None
+        assert db_manager._remote_sql_active()
+
+        conn = sqlite3.connect(server_db)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        assert set(db_manager.DB_INDEXES) <= indexes
+
+        # Indexes that already exist aren't created again
+        ssh.commands.clear()
+        assert db_manager.initialize_database()
+        assert len(ssh.commands) == 1
+
+    def test_lookups_and_updates_run_remotely(self, remote_sql):
+        """Paid checks, payment updates and listings all go to the server's file"""
+        server_db, ssh = remote_sql
+        assert db_manager.initialize_database()
+
+        assert db_manager.check_items_paid_bulk([('1', 'ORD1'), ('3', 'ORD2')]) == set()
+        assert db_manager.get_bills_paid_count('ORD2') == 1
+        assert db_manager.bulk_update_payment_info([('1', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31')]) == [True]
+        assert db_manager.check_if_item_paid('1', 'ORD1')
+        assert db_manager.get_bills_paid_count('ORD1') == 1
+        assert len(db_manager.list_line_items('ORD1')) == 2
+        assert db_manager._CONN is None
+
+
+class TestCachedReads:
+    """Memoized paid checks never outliving a write"""
+
+    def test_bulk_update_then_check(self, remote_db):
+        """A pair checked before a bulk update reads as paid after it, whatever type its id had"""
+        assert db_manager.check_if_item_paid('1', 'ORD1') is False
+        assert db_manager.check_if_item_paid(2, 'ORD1') is False
+        assert db_manager.get_bills_paid_count('ORD1') == 0
+
+        assert db_manager.bulk_update_payment_info([
+            (1, 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31'),
+            ('2', 'ORD1', '50.0', 50.0, 'E1', 'E1', '2025-01-31'),
+        ]) == [True, True]
+
+        assert db_manager.check_if_item_paid('1', 'ORD1') is True
+        assert db_manager.check_if_item_paid(2, 'ORD1') is True
+        assert db_manager.get_bills_paid_count('ORD1') == 2
+
+    def test_reads_inside_batch_not_kept(self, remote_db):
+        """A check made mid-batch doesn't survive the batch's commit"""
+        with db_manager.payment_batch() as batch:
+            assert batch.update('1', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31')
+            db_manager.check_if_item_paid('1', 'ORD1')
+            db_manager.get_bills_paid_count('ORD1')
+
+        assert db_manager.check_if_item_paid('1', 'ORD1') is True
+        assert db_manager.get_bills_paid_count('ORD1') == 1
+
+    def test_close_db_drops_cached_reads(self, remote_db):
+        assert db_manager.check_if_item_paid('1', 'ORD1') is False
+        db_manager.close_db()
+        assert db_manager._item_paid_cache == {}
+        assert db_manager._bills_paid_cache == {}
+
+
+class TestBind:
+    """Parameters rendered as literals for the sqlite3 CLI"""
+
+    @pytest.mark.parametrize("value", [
+        "O'Brien",
+        "it''s ''quoted''",
+        "semi; DROP TABLE orders; --",
+        None,
+        0.1,
+        123.45,
+        1e-7,
+        -42,
+        b"\x00\xff",
+    ])
+    def test_literal_round_trips(self, value):
+        """A bound literal reads back as the value that was bound"""
+        conn = sqlite3.connect(':memory:')
+        assert conn.execute(db_manager._bind("SELECT ?", (value,))).fetchone()[0] == value
+        conn.close()
+
+    def test_bools_bind_as_integers(self):
+        assert db_manager._bind("SELECT ?, ?", (True, False)) == "SELECT 1, 0"
+
+    def test_question_marks_inside_values_are_kept(self):
+        """Only the statement's placeholders are substituted, not ? inside values"""
+        assert db_manager._bind("SELECT ?, ?", ("a?b", None)) == "SELECT 'a?b', NULL"
+
+    def test_parameter_count_must_match(self):
+        with pytest.raises(ValueError):
+            db_manager._bind("SELECT ?, ?", (1,))
+
+
+class TestRemoteWrites:
+    """Payment writes reaching the server through sqlite3 scripts"""
+
+    def test_update_payment_info_is_one_transaction(self, remote_sql):
+        """If the BILLS_PAID increment fails, the line item update is undone with it"""
+        server_db, ssh = remote_sql
+        conn = sqlite3.connect(server_db)
+        conn.execute("CREATE TRIGGER no_bills BEFORE UPDATE ON orders BEGIN SELECT RAISE(ABORT, 'locked'); END")
+        conn.commit()
+        conn.close()
+
+        assert db_manager.update_payment_info('1', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31') is False
+        assert len(ssh.commands) == 1
+
+        conn = sqlite3.connect(server_db)
+        assert conn.execute("SELECT BR_paid FROM line_items WHERE id = '1'").fetchone()[0] is None
+        conn.close()
+
+    def test_update_payment_info_skips_missing_items(self, remote_sql):
+        """An unknown line item changes nothing, BILLS_PAID included"""
+        server_db, ssh = remote_sql
+
+        assert db_manager.update_payment_info('99', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31') is False
+        assert db_manager.get_bills_paid_count('ORD1') == 0
+
+    def test_changelog_replayed_on_flush(self, remote_sql, tmp_path, monkeypatch):
+        """Writes made on a downloaded copy are replayed on the server instead of uploading the file"""
+        server_db, ssh = remote_sql
+        downloaded = tmp_path / 'downloaded.db'
+        shutil.copy(server_db, downloaded)
+        monkeypatch.setattr(db_manager, 'get_remote_db_connection', lambda: (sqlite3.connect(downloaded, check_same_thread=False), str(downloaded)))
+        monkeypatch.setattr(db_manager, '_cleanup', lambda path: None)
+
+        def no_upload(path):
+            raise AssertionError("database file was uploaded")
+
+        monkeypatch.setattr(db_manager, 'push_db_changes_to_remote', no_upload)
+
+        with db_manager.payment_batch() as batch:
+            assert batch.update('1', 'ORD1', "O'Brien", 123.45, 'E1', None, '2025-01-31')
+            assert batch.update('3', 'ORD2', '75.0', 0.1, "it's", 'H3', '2025-01-31')
+            assert not batch.update('99', 'ORD1', '1.0', 1.0, 'E9', 'E9', '2025-01-31')
+
+        assert db_manager.flush_db_to_remote()
+        assert db_manager._CHANGELOG == []
+
+        conn = sqlite3.connect(server_db)
+        items = conn.execute("SELECT id, BR_paid, BR_rate, EOBR_doc_no, HCFA_doc_no FROM line_items ORDER BY id").fetchall()
+        orders = conn.execute("SELECT Order_ID, BILLS_PAID FROM orders ORDER BY Order_ID").fetchall()
+        conn.close()
+        assert items == [
+            ('1', "O'Brien", 123.45, 'E1', None),
+            ('2', None, None, None, None),
+            ('3', '75.0', 0.1, "it's", 'H3'),
+        ]
+        assert [(order_id, int(paid)) for order_id, paid in orders] == [('ORD1', 1), ('ORD2', 2)]
+
+
+class TestUpload:
+    """What flush_db_to_remote() hands to the upload"""
+
+    def test_uploaded_copy_is_not_wal(self, remote_db, tmp_path):
+        """A copy that arrived in WAL mode is uploaded as a self-contained rollback-journal file"""
+        conn = sqlite3.connect(tmp_path / 'downloaded.db')
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        # The read connection being open must not block the switch
+        assert db_manager.check_if_item_paid('1', 'ORD1') is False
+        assert db_manager.update_payment_info('1', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31')
+        assert db_manager.flush_db_to_remote()
+
+        assert len(remote_db) == 1
+        uploaded = sqlite3.connect(remote_db[0])
+        assert uploaded.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        assert uploaded.execute("SELECT BR_paid FROM line_items WHERE id = '1'").fetchone()[0] == '100.0'
+        uploaded.close()
+
+    def test_pragmas_leave_journal_mode_alone(self, remote_db, tmp_path):
+        """Opening the database doesn't convert it to WAL"""
+        assert db_manager.initialize_database()
+        db_manager.close_db()
+
+        conn = sqlite3.connect(tmp_path / 'downloaded.db')
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        conn.close()
+
+
+class TestFailedPush:
+    """A run whose changes can't reach the server"""
+
+    def test_close_db_saves_unpushed_copy(self, remote_db, tmp_path, monkeypatch):
+        monkeypatch.setattr(db_manager, 'push_db_changes_to_remote', lambda path: False)
+        monkeypatch.setattr(db_manager, 'UNPUSHED_DB_DIR', tmp_path / 'unpushed')
+        (tmp_path / 'unpushed').mkdir()
+
+        assert db_manager.update_payment_info('1', 'ORD1', '100.0', 100.0, 'E1', 'E1', '2025-01-31')
+        db_manager.close_db()
+
+        saved = list((tmp_path / 'unpushed').glob('filemaker.unpushed.*.db'))
+        assert len(saved) == 1
+        conn = sqlite3.connect(saved[0])
+        assert conn.execute("SELECT BR_paid FROM line_items WHERE id = '1'").fetchone()[0] == '100.0'
+        conn.close()
+        assert db_manager._DIRTY
+
+    def test_in_memory_database_is_saved(self, remote_db, tmp_path, monkeypatch):
+        """With the copy held in memory (CDX_DB_IN_MEMORY=1) the saved file is the only copy left"""
+        memory = sqlite3.connect(':memory:', check_same_thread=False)
+        create_filemaker_db(tmp_path / 'server.db')
+        source = sqlite3.connect(tmp_path / 'server.db')
+        source.backup(memory)
+        source.close()
+        monkeypatch.setattr(db_manager, 'get_remote_db_connection', lambda: (memory, None))
+        monkeypatch.setattr(db_manager, 'push_db_changes_to_remote', lambda path: False)
+        monkeypatch.setattr(db_manager, 'DB_TEMP_DIR', str(tmp_path))
+        monkeypatch.setattr(db_manager, 'UNPUSHED_DB_DIR', tmp_path / 'unpushed')
+        (tmp_path / 'unpushed').mkdir()
+
+        assert db_manager.update_payment_info('3', 'ORD2', '75.0', 75.0, 'E3', 'E3', '2025-01-31')
+        db_manager.close_db()
+
+        saved, = (tmp_path / 'unpushed').glob('filemaker.unpushed.*.db')
+        conn = sqlite3.connect(saved)
+        assert conn.execute("SELECT BR_paid FROM line_items WHERE id = '3'").fetchone()[0] == '75.0'
+        assert int(conn.execute("SELECT BILLS_PAID FROM orders WHERE Order_ID = 'ORD2'").fetchone()[0]) == 2
+        conn.close()
+
+
+@pytest.fixture
+def server_file(tmp_path, monkeypatch):
+    """push_db_changes_to_remote() over a local shell, against a file standing in for the server's"""
+    server_db = tmp_path / 'server' / 'filemaker.db'
+    server_db.parent.mkdir()
+    create_filemaker_db(server_db)
+    monkeypatch.setattr(db_manager, 'REMOTE_DB_PATH', str(server_db))
+    monkeypatch.setattr(db_manager, 'USE_PSSH', False)
+    monkeypatch.setattr(db_manager, '_get_ssh', lambda: LocalSSH())
+    monkeypatch.setattr(db_manager, '_REMOTE_STAT', None)
+    return server_db
+
+
+class TestPushGuard:
+    """The upload refusing to replace a server file that changed since the download"""
+
+    def upload(self, tmp_path, br_paid):
+        local = tmp_path / f'local-{br_paid}.db'
+        create_filemaker_db(local)
+        conn = sqlite3.connect(local)
+        conn.execute("UPDATE line_items SET BR_paid = ? WHERE id = '1'", (br_paid,))
+        conn.commit()
+        conn.close()
+        return db_manager.push_db_changes_to_remote(str(local))
+
+    def server_br_paid(self, server_db):
+        conn = sqlite3.connect(server_db)
+        try:
+            return conn.execute("SELECT BR_paid FROM line_items WHERE id = '1'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_unchanged_server_file_is_replaced(self, server_file, tmp_path):
+        db_manager._REMOTE_STAT = db_manager._remote_db_stat()
+
+        assert self.upload(tmp_path, '100.0')
+        assert self.server_br_paid(server_file) == '100.0'
+        assert len(list(server_file.parent.glob('filemaker.db.bak.*'))) == 1
+
+        # The stat now follows the upload, so a second push in the run goes through
+        assert db_manager._REMOTE_STAT == db_manager._remote_db_stat()
+        assert self.upload(tmp_path, '200.0')
+        assert self.server_br_paid(server_file) == '200.0'
+
+    def test_changed_server_file_is_kept(self, server_file, tmp_path):
+        db_manager._REMOTE_STAT = db_manager._remote_db_stat()
+        # Someone else commits to the server's file during the run
+        conn = sqlite3.connect(server_file)
+        conn.execute("UPDATE line_items SET BR_paid = 'portal' WHERE id = '1'")
+        conn.commit()
+        conn.close()
+        stat = server_file.stat()
+        os.utime(server_file, (stat.st_atime, stat.st_mtime + 5))
+
+        assert not self.upload(tmp_path, '100.0')
+        assert self.server_br_paid(server_file) == 'portal'
+        assert sorted(p.name for p in server_file.parent.iterdir()) == ['filemaker.db']
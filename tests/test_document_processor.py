@@ -0,0 +1,66 @@
+from docx import Document
+
+from processors import document_processor
+
+
+def paragraph_with_runs(*texts):
+    """A document whose only paragraph has one run per text; the last run is bold"""
+    doc = Document()
+    p = doc.add_paragraph()
+    for text in texts:
+        run = p.add_run(text)
+    run.bold = True
+    return doc, p
+
+
+class TestPopulatePlaceholders:
+    """Placeholder substitution keeping each run's formatting"""
+
+    def test_placeholder_in_one_run(self):
+        doc, p = paragraph_with_runs("Patient: <patient_name>", " (see below)")
+
+        document_processor.populate_placeholders(doc, {"<patient_name>": "Jane Doe"})
+
+        assert [run.text for run in p.runs] == ["Patient: Jane Doe", " (see below)"]
+        assert p.runs[1].bold
+
+    def test_placeholder_split_across_runs(self):
+        """Word often splits '<patient_name>' over several runs; it is joined into the first"""
+        doc, p = paragraph_with_runs("Patient: <pat", "ient_", "name> on <dos1>", " paid")
+
+        document_processor.populate_placeholders(doc, {"<patient_name>": "Jane Doe", "<dos1>": "04.02.2025"})
+
+        assert p.text == "Patient: Jane Doe on 04.02.2025 paid"
+        assert [run.text for run in p.runs] == ["Patient: Jane Doe on 04.02.2025", "", "", " paid"]
+        assert p.runs[3].bold
+
+    def test_unknown_and_unclosed_placeholders_left_alone(self):
+        doc, p = paragraph_with_runs("<unknown> <cpt1> a < b", " end")
+
+        document_processor.populate_placeholders(doc, {"<cpt1>": "70551"})
+
+        assert [run.text for run in p.runs] == ["<unknown> 70551 a < b", " end"]
+
+    def test_keeps_surrounding_spaces(self):
+        doc, p = paragraph_with_runs("<charge1>", "x")
+
+        document_processor.populate_placeholders(doc, {"<charge1>": " $10.00 "})
+
+        assert p.runs[0].text == " $10.00 "
+        assert p.runs[0]._r.find(document_processor._W_T).get(document_processor._XML_SPACE) == "preserve"
+
+    def test_literal_less_than_is_not_merged(self):
+        """A '<' in body text doesn't pull later runs into its own"""
+        doc, p = paragraph_with_runs("if a < b", " then ", "<cp", "t1>", " bold")
+
+        document_processor.populate_placeholders(doc, {"<cpt1>": "70551"})
+
+        assert [run.text for run in p.runs] == ["if a < b", " then ", "70551", "", " bold"]
+        assert p.runs[4].bold
+
+    def test_unclosed_less_than_after_placeholder(self):
+        doc, p = paragraph_with_runs("<cp", "t1> costs < ", "more", " bold")
+
+        document_processor.populate_placeholders(doc, {"<cpt1>": "70551"})
+
+        assert [run.text for run in p.runs] == ["70551 costs < ", "", "more", " bold"]
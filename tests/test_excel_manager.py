@@ -0,0 +1,183 @@
+import sqlite3
+
+import pytest
+from datetime import datetime
+from openpyxl import load_workbook
+from openpyxl.styles import Font
+
+from data import excel_manager
+
+
+@pytest.fixture
+def historical_paths(tmp_path, monkeypatch):
+    """Point the historical workbook, index and parquet dataset at tmp_path"""
+    monkeypatch.setattr(excel_manager, 'HISTORICAL_EXCEL_PATH', tmp_path / 'Historical_EOBR_Data.xlsx')
+    monkeypatch.setattr(excel_manager, 'HISTORICAL_INDEX_PATH', tmp_path / 'Historical_EOBR_Data.index.db')
+    monkeypatch.setattr(excel_manager, 'HISTORICAL_PARQUET_DIR', tmp_path / 'Historical_EOBR_Data')
+    excel_manager.initialize_excel_file(excel_manager.HISTORICAL_EXCEL_PATH)
+    return excel_manager.HISTORICAL_EXCEL_PATH
+
+
+def eobr_data(control_number, serial, cpt):
+    """Minimal append_to_excel() data for one EOBR line"""
+    return {
+        'Full Duplicate Key': f"{control_number}|{cpt}",
+        'EOBR Number': f"{control_number}-{serial}",
+        'Description': f"{cpt}, Test procedure",
+        'Amount': 100.0,
+    }
+
+
+def indexed_rows():
+    """Rows currently committed to the historical index"""
+    conn = sqlite3.connect(excel_manager.HISTORICAL_INDEX_PATH)
+    try:
+        return conn.execute("SELECT dup_key, control_number, serial FROM eobr_log").fetchall()
+    finally:
+        conn.close()
+
+
+class TestFlushExcelAppends:
+    """Queued rows reaching the workbook"""
+
+    def test_flush_keeps_sheets_and_formatting(self, tmp_path):
+        """Flushing appends to the active sheet and leaves everything else as it was"""
+        path = tmp_path / 'EOBR_Data.xlsx'
+        excel_manager.initialize_excel_file(path)
+
+        wb = load_workbook(path)
+        ws = wb.active
+        ws.append(['Y', None, None, None, None, None, None, None, datetime(2025, 1, 31), None, None, None, 12.5])
+        ws['I2'].number_format = 'mm/dd/yyyy'
+        ws['M2'].number_format = '"$"#,##0.00'
+        ws['A1'].font = Font(bold=True)
+        ws.column_dimensions['L'].width = 42
+        ws.freeze_panes = 'A2'
+        ws.auto_filter.ref = 'A1:O2'
+        notes = wb.create_sheet('Notes')
+        notes['A1'] = 'kept'
+        wb.save(path)
+
+        excel_manager.append_to_excel(path, {'Release Payment': 'N', 'Amount': 7.25})
+        excel_manager.flush_excel_appends(path)
+
+        wb = load_workbook(path)
+        ws = wb['EOBR Data']
+        assert wb.sheetnames == ['EOBR Data', 'Notes']
+        assert wb['Notes']['A1'].value == 'kept'
+        assert ws.max_row == 3
+        assert ws['A3'].value == 'N'
+        assert ws['M3'].value == 7.25
+        assert ws['I2'].value == datetime(2025, 1, 31)
+        assert ws['I2'].number_format == 'mm/dd/yyyy'
+        assert ws['M2'].number_format == '"$"#,##0.00'
+        assert ws['A1'].font.bold
+        assert ws.column_dimensions['L'].width == 42
+        assert ws.freeze_panes == 'A2'
+        assert ws.auto_filter.ref == 'A1:O2'
+        assert not excel_manager.pending_path(path).exists()
+
+
+class TestHistoricalIndex:
+    """The historical index staying in step with the workbook and its sidecar"""
+
+    def test_unflushed_rows_are_replayed_on_reload(self, historical_paths):
+        """Rows queued by a run that died before flushing reach the workbook at the next load"""
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 2, '71045'))
+
+        duplicates, serials = excel_manager.load_historical_duplicates()
+
+        assert duplicates == {'C100|70551', 'C100|71045'}
+        assert serials == {'C100': 2}
+        assert not excel_manager.pending_path(historical_paths).exists()
+        assert load_workbook(historical_paths).active.max_row == 3
+
+        # A second load finds the index in step and gives the same answer
+        assert excel_manager.load_historical_duplicates() == (duplicates, serials)
+
+    def test_index_rebuilt_when_workbook_changes(self, historical_paths):
+        """Rows added to the workbook outside this module are picked up through its mtime"""
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+        excel_manager.load_historical_duplicates()
+
+        wb = load_workbook(historical_paths)
+        wb.active.append(['Y', None, 'C200|72125', None, 'C200-7', None, None, None, None, None, None, '72125, CT'])
+        wb.save(historical_paths)
+
+        duplicates, serials = excel_manager.load_historical_duplicates()
+
+        assert duplicates == {'C100|70551', 'C200|72125'}
+        assert serials == {'C100': 1, 'C200': 7}
+
+    def test_failed_index_write_still_queues_row(self, historical_paths, monkeypatch):
+        """A row the index missed is still written, and the index is rebuilt to include it"""
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+        excel_manager.load_historical_duplicates()
+
+        def broken_index():
+            raise sqlite3.OperationalError("database is locked")
+
+        open_history_index = excel_manager._open_history_index
+        monkeypatch.setattr(excel_manager, '_open_history_index', broken_index)
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 2, '71045'))
+        monkeypatch.setattr(excel_manager, '_open_history_index', open_history_index)
+
+        duplicates, serials = excel_manager.load_historical_duplicates()
+
+        assert duplicates == {'C100|70551', 'C100|71045'}
+        assert serials == {'C100': 2}
+
+    def test_failed_queue_write_rolls_back_index(self, historical_paths, monkeypatch):
+        """A row that couldn't be queued is not left behind in the index"""
+        def broken_queue(file_path, line):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(excel_manager, '_queue_line', broken_queue)
+        with pytest.raises(OSError):
+            excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+
+        assert indexed_rows() == []
+
+    def test_parquet_sink_keeps_index_in_step(self, historical_paths, monkeypatch):
+        """With the parquet sink, queued rows land in the dataset and stay indexed"""
+        pytest.importorskip('pyarrow')
+        monkeypatch.setattr(excel_manager, 'HISTORICAL_PARQUET', True)
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+        excel_manager.load_historical_duplicates()
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 2, '71045'))
+
+        duplicates, serials = excel_manager.load_historical_duplicates()
+
+        assert duplicates == {'C100|70551', 'C100|71045'}
+        assert serials == {'C100': 2}
+        assert load_workbook(historical_paths).active.max_row == 1
+        assert excel_manager.HISTORICAL_PARQUET_DIR.exists()
+        assert len(indexed_rows()) == 2
+
+    def test_locked_workbook_keeps_duplicate_detection(self, historical_paths, monkeypatch):
+        """Queued rows that can't be flushed stay queued and still count as duplicates"""
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 1, '70551'))
+        excel_manager.load_historical_duplicates()
+        excel_manager.append_to_excel(historical_paths, eobr_data('C100', 2, '71045'))
+
+        def locked(file_path, rows):
+            raise PermissionError("the workbook is open in another program")
+
+        append_rows = excel_manager._append_rows
+        monkeypatch.setattr(excel_manager, '_append_rows', locked)
+        duplicates, serials = excel_manager.load_historical_duplicates()
+
+        assert duplicates == {'C100|70551', 'C100|71045'}
+        assert serials == {'C100': 2}
+        assert excel_manager.pending_path(historical_paths).exists()
+
+        # A rebuild (here from a lost index) reads the sidecar too
+        excel_manager.HISTORICAL_INDEX_PATH.unlink()
+        assert excel_manager.load_historical_duplicates() == (duplicates, serials)
+
+        # Once the workbook can be written the queued row reaches it
+        monkeypatch.setattr(excel_manager, '_append_rows', append_rows)
+        excel_manager.load_historical_duplicates()
+        assert load_workbook(historical_paths).active.max_row == 3
+        assert not excel_manager.pending_path(historical_paths).exists()
@@ -0,0 +1,96 @@
+import pytest
+from datetime import date, datetime, timedelta
+from dateutil.parser import parse
+import holidays
+
+from utils import formatters
+
+
+def stepped_due_date(bill_date, us_holidays):
+    """The original day-by-day calculate_due_date loop"""
+    due_date = bill_date
+    days_added = 0
+    while days_added < 45:
+        due_date += timedelta(days=1)
+        if due_date.weekday() < 5 and due_date not in us_holidays:
+            days_added += 1
+    return due_date
+
+
+def stepped_weekdays(start, count):
+    """Day count weekdays after start, one day at a time"""
+    day = start
+    while count:
+        day += timedelta(days=1)
+        if day.weekday() < 5:
+            count -= 1
+    return day
+
+
+class TestDueDate:
+    """Due dates against the day-by-day loop they replaced"""
+
+    @pytest.mark.parametrize('count', [0, 1, 4, 5, 6, 9, 45])
+    def test_add_weekdays_from_every_weekday(self, count):
+        # Mon 2024-12-23 .. Sun 2024-12-29, so weekend starts are covered too
+        for start in (date(2024, 12, 23) + timedelta(days=n) for n in range(7)):
+            expected = stepped_weekdays(start, count)
+            assert formatters._add_weekdays(start.toordinal(), count) == expected.toordinal(), start
+
+    def test_matches_stepped_loop_through_the_holidays(self):
+        """Every bill date from October to January, when most weekday holidays fall"""
+        us_holidays = holidays.US(years=formatters.HOLIDAY_YEARS)
+        for year in (2021, 2022, 2023, 2024):
+            bill_date = date(year, 10, 1)
+            while bill_date < date(year + 1, 2, 1):
+                assert formatters.calculate_due_date(bill_date) == stepped_due_date(bill_date, us_holidays), bill_date
+                bill_date += timedelta(days=1)
+
+    def test_keeps_the_bill_date_type(self):
+        due = formatters.calculate_due_date(datetime(2024, 11, 27, 9, 30))
+
+        assert due == datetime(2025, 2, 4, 9, 30)
+
+
+class TestParseMoney:
+    """parse_money() on the amounts found in bills"""
+
+    @pytest.mark.parametrize('value, expected', [
+        ("$1,234.56", 1234.56),
+        ("1234.56", 1234.56),
+        (250, 250.0),
+        (12.5, 12.5),
+        # Neither parsed before parse_money existed either
+        ("(12.00)", 0.0),
+        ("", 0.0),
+        (None, 0.0),
+    ])
+    def test_parses(self, value, expected):
+        assert formatters.parse_money(value) == expected
+
+
+class TestParseDate:
+    """The strptime fast path agreeing with dateutil"""
+
+    @pytest.mark.parametrize('date_str', [
+        "2025-04-02", "04/02/2025", "04/02/25", "2025/04/02",
+        "4/2/25", "12/31/68", "01/01/00",
+        # Outside %y's 2000-2068 agreement with dateutil, so left to dateutil
+        "04/02/69", "04/02/99",
+        "April 2, 2025", "20250402",
+    ])
+    def test_matches_dateutil(self, date_str):
+        assert formatters._parse_date(date_str) == parse(date_str)
+
+    @pytest.mark.parametrize('date_str', ["2025-04-02", "04/02/2025", "04/02/25", "2025/04/02"])
+    def test_common_formats_skip_dateutil(self, date_str, monkeypatch):
+        def no_dateutil(value):
+            raise AssertionError(f"dateutil asked to parse {value!r}")
+
+        monkeypatch.setattr(formatters, 'parse', no_dateutil)
+
+        assert formatters._parse_date(date_str).date() == date(2025, 4, 2)
+
+    def test_eob_date_takes_first_of_a_range(self):
+        assert formatters.format_date_for_eob("04/02/25 - 04/09/25") == "2025-04-02"
+        assert formatters.format_date("not a date") == "not a date"
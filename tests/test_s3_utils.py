@@ -0,0 +1,164 @@
+import pytest
+
+from utils import s3_utils
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 calls the move helpers make"""
+
+    def __init__(self, keys):
+        self.objects = {key: f"body of {key}" for key in keys}
+        self.fail_copies = set()
+        self.delete_errors = {}  # key -> number of DeleteObjects calls that report it as an error
+        self.delete_calls = []
+        self.list_calls = 0
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise KeyError(f"404: {Key}")
+        body = self.objects[Key]
+        return {'ContentLength': len(body), 'ETag': f'"{hash(body)}"'}
+
+    def copy_object(self, Bucket, CopySource, Key):
+        if CopySource['Key'] in self.fail_copies:
+            raise IOError("copy refused")
+        self.objects[Key] = self.objects[CopySource['Key']]
+        return {'CopyObjectResult': {'ETag': f'"{hash(self.objects[Key])}"'}}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+        return {}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        self.list_calls += 1
+        yield {'Contents': [{'Key': key} for key in sorted(self.objects) if key.startswith(Prefix)]}
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.delete_calls.append(keys)
+        errors = []
+        for key in keys:
+            if self.delete_errors.get(key):
+                self.delete_errors[key] -= 1
+                errors.append({'Key': key, 'Code': 'InternalError', 'Message': 'try again'})
+            else:
+                self.objects.pop(key, None)
+        return {'Errors': errors} if errors else {}
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    s3 = FakeS3(['src/a.json', 'src/b.json', 'src/c.json'])
+    monkeypatch.setattr(s3_utils, '_S3', s3)
+    monkeypatch.setattr(s3_utils.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(s3_utils, '_LISTINGS', {})
+    return s3
+
+
+class TestListObjects:
+    """Listing reuse through max_age"""
+
+    def test_listing_reused_within_max_age(self, fake_s3):
+        assert s3_utils.list_objects('src/', max_age=60) == ['src/a.json', 'src/b.json', 'src/c.json']
+        assert s3_utils.list_objects('src/', max_age=60) == ['src/a.json', 'src/b.json', 'src/c.json']
+        assert fake_s3.list_calls == 1
+
+    def test_write_drops_listing(self, fake_s3):
+        s3_utils.list_objects('src/', max_age=60)
+        s3_utils.move_keys([('src/a.json', 'dst/a.json')])
+
+        assert s3_utils.list_objects('src/', max_age=60) == ['src/b.json', 'src/c.json']
+        assert fake_s3.list_calls == 2
+
+    def test_plain_listing_is_not_kept(self, fake_s3):
+        s3_utils.list_objects('src/')
+        s3_utils.list_objects('dst/')
+
+        assert s3_utils._LISTINGS == {}
+
+
+class TestMoveKeys:
+    """Moving many objects with move_keys()"""
+
+    def test_moves_copied_objects(self, fake_s3):
+        pairs = ((key, key.replace('src/', 'dst/')) for key in ['src/a.json', 'src/b.json'])
+
+        moved, failed = s3_utils.move_keys(pairs, workers=4)
+
+        assert sorted(moved) == [('src/a.json', 'dst/a.json'), ('src/b.json', 'dst/b.json')]
+        assert failed == []
+        assert sorted(fake_s3.objects) == ['dst/a.json', 'dst/b.json', 'src/c.json']
+
+    def test_failed_copy_keeps_original(self, fake_s3):
+        fake_s3.fail_copies.add('src/b.json')
+        pairs = [('src/a.json', 'dst/a.json'), ('src/b.json', 'dst/b.json'), ('src/missing.json', 'dst/missing.json')]
+
+        moved, failed = s3_utils.move_keys(pairs, workers=4)
+
+        assert moved == [('src/a.json', 'dst/a.json')]
+        assert sorted(key for key, _ in failed) == ['src/b.json', 'src/missing.json']
+        assert sorted(fake_s3.objects) == ['dst/a.json', 'src/b.json', 'src/c.json']
+
+
+class TestDeleteObjects:
+    """Batched deletes and their retries"""
+
+    def test_partial_failures_are_retried(self, fake_s3):
+        """Only the keys S3 reported in Errors go into the next request"""
+        fake_s3.delete_errors['src/b.json'] = 2
+
+        failed = s3_utils.delete_objects(['src/a.json', 'src/b.json'])
+
+        assert failed == {}
+        assert fake_s3.delete_calls == [['src/a.json', 'src/b.json'], ['src/b.json'], ['src/b.json']]
+        assert sorted(fake_s3.objects) == ['src/c.json']
+
+    def test_reports_keys_that_never_delete(self, fake_s3):
+        fake_s3.delete_errors['src/b.json'] = 10
+
+        failed = s3_utils.delete_objects(['src/a.json', 'src/b.json'], max_retries=3)
+
+        assert failed == {'src/b.json': 'InternalError: try again'}
+        assert len(fake_s3.delete_calls) == 3
+        assert 'src/b.json' in fake_s3.objects
+
+    def test_move_keys_reports_undeleted_originals(self, fake_s3, caplog):
+        """A copy whose original can't be deleted still counts as moved, with a warning"""
+        fake_s3.delete_errors['src/a.json'] = 10
+
+        moved, failed = s3_utils.move_keys([('src/a.json', 'dst/a.json')])
+
+        assert moved == [('src/a.json', 'dst/a.json')]
+        assert failed == []
+        assert 'failed to delete the original' in caplog.text
+        assert 'Moved: src/a.json' not in caplog.text
+
+    def test_originals_deleted_as_copies_finish(self, fake_s3, monkeypatch, caplog):
+        """Deletes don't wait for the last copy, and only deleted originals are logged as moved"""
+        caplog.set_level('INFO', logger=s3_utils.logger.name)
+        monkeypatch.setattr(s3_utils, 'MOVE_DELETE_EVERY', 2)
+        fake_s3.delete_errors['src/c.json'] = 10
+        pairs = [(key, key.replace('src/', 'dst/')) for key in ['src/a.json', 'src/b.json', 'src/c.json']]
+
+        moved, failed = s3_utils.move_keys(pairs, workers=1)
+
+        assert len(moved) == 3
+        assert [len(keys) for keys in fake_s3.delete_calls] == [2, 1, 1, 1]
+        assert 'Moved: src/a.json -> dst/a.json' in caplog.text
+        assert 'Moved: src/b.json -> dst/b.json' in caplog.text
+        assert 'Moved: src/c.json' not in caplog.text
+        assert 'Copied src/c.json -> dst/c.json but failed to delete the original' in caplog.text
+
+
+class TestMoveWithConfirmation:
+    """Single-object moves"""
+
+    def test_logs_start_once(self, fake_s3, caplog):
+        caplog.set_level('INFO', logger=s3_utils.logger.name)
+
+        assert s3_utils.move_with_confirmation('src/a.json', 'dst/a.json')[0]
+        assert caplog.text.count('Starting robust') == 1
+        assert sorted(fake_s3.objects) == ['dst/a.json', 'src/b.json', 'src/c.json']
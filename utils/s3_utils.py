@@ -3,6 +3,9 @@ import boto3
 import json
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.config import Config
 from dotenv import load_dotenv
 
 load_dotenv()  # pulls AWS_* and S3_BUCKET into os.environ
@@ -10,24 +13,59 @@ load_dotenv()  # pulls AWS_* and S3_BUCKET into os.environ
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Default thread count for bulk moves; the client's connection pool is sized
+# to match so concurrent moves don't queue for connections
+MOVE_WORKERS = 32
+
 # Initialize once
 _S3 = boto3.client(
     "s3",
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
     region_name=os.getenv("AWS_DEFAULT_REGION"),
+    config=Config(max_pool_connections=MOVE_WORKERS),
 )
 _BUCKET = os.getenv("S3_BUCKET")
 
+# Recent listings, reused by list_objects(max_age=...) callers. Every write
+# made through this module drops the listings it affects.
+LIST_CACHE_TTL = 60  # seconds the movers reuse a listing for
+_LISTINGS = {}  # prefix -> (monotonic time listed, keys)
+_LISTINGS_LOCK = threading.Lock()
+
+
+def _forget_listings(*keys):
+    """Drop cached listings whose prefix covers any of the given keys."""
+    with _LISTINGS_LOCK:
+        for prefix in [p for p in _LISTINGS if any(key.startswith(p) for key in keys)]:
+            del _LISTINGS[prefix]
+
+
+def list_objects(prefix: str, max_age: float = None):
+    """List all object keys in the bucket under a prefix.
 
-def list_objects(prefix: str):
-    """List all object keys in the bucket under a prefix."""
+    With max_age, a listing of the same prefix taken in the last max_age
+    seconds (and not invalidated by a write since) is returned instead of
+    paging through LIST requests again, and the fresh listing is kept for
+    the next such call. Without it the listing is neither reused nor kept,
+    so long-lived callers don't fill the cache with prefixes nobody reuses.
+    """
+    if max_age is not None:
+        with _LISTINGS_LOCK:
+            cached = _LISTINGS.get(prefix)
+        if cached and time.monotonic() - cached[0] < max_age:
+            return list(cached[1])
+    
+    listed_at = time.monotonic()
     paginator = _S3.get_paginator("list_objects_v2")
     keys = []
     for page in paginator.paginate(Bucket=_BUCKET, Prefix=prefix):
         for obj in page.get("Contents", []):
             keys.append(obj["Key"])
-    return keys
+    if max_age is not None:
+        with _LISTINGS_LOCK:
+            _LISTINGS[prefix] = (listed_at, keys)
+    return list(keys)
 
 
 def download(key: str, local_path: str):
@@ -40,6 +78,7 @@ def download(key: str, local_path: str):
 def upload(local_path: str, key: str):
     """Upload a local file to S3 under the given key."""
     _S3.upload_file(local_path, _BUCKET, key)
+    _forget_listings(key)
 
 
 def move(src_key: str, dest_key: str):
@@ -48,12 +87,14 @@ def move(src_key: str, dest_key: str):
                     CopySource={"Bucket": _BUCKET, "Key": src_key},
                     Key=dest_key)
     _S3.delete_object(Bucket=_BUCKET, Key=src_key)
+    _forget_listings(src_key, dest_key)
 
 
-def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
+def copy_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
     """
-    Safely move an S3 object by copying first, then deleting the original only after
-    confirming the copy was successful. Includes retries and verification.
+    The copy half of move_with_confirmation: copy an S3 object and verify the
+    copy, leaving the original in place. Lets callers moving many files delete
+    the originals in bulk with delete_objects().
     
     Args:
         source_key (str): S3 key of the source object
@@ -63,10 +104,10 @@ def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
         
     Returns:
         tuple: (success, result)
-            - success (bool): True if move was successful
+            - success (bool): True if the copy was made and verified
             - result (dict): Details about the operation
     """
-    logger.info(f"Starting robust move operation: {source_key} -> {dest_key}")
+    logger.info(f"Starting robust copy operation: {source_key} -> {dest_key}")
     
     result = {
         'source_key': source_key,
@@ -116,6 +157,7 @@ def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
                 Key=dest_key
             )
             result['copy_success'] = True
+            _forget_listings(dest_key)
             result['copy_etag'] = copy_response.get('CopyObjectResult', {}).get('ETag', '').strip('"')
             result['retries']['copy'] = retry_count
             logger.info(f"Successfully copied: {source_key} -> {dest_key} (Attempt: {retry_count+1})")
@@ -167,6 +209,36 @@ def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
         logger.error(result['error'])
         return False, result
     
+    return True, result
+
+
+def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
+    """
+    Safely move an S3 object by copying first, then deleting the original only after
+    confirming the copy was successful. Includes retries and verification.
+    
+    Args:
+        source_key (str): S3 key of the source object
+        dest_key (str): S3 key for the destination object
+        s3_client (boto3.client, optional): Initialized S3 client, or None to use default
+        max_retries (int): Maximum number of retry attempts
+        
+    Returns:
+        tuple: (success, result)
+            - success (bool): True if move was successful
+            - result (dict): Details about the operation
+    """
+    # Initialize S3 client if not provided
+    if s3_client is None:
+        s3_client = _S3
+    
+    bucket = _BUCKET
+    
+    # Steps 1-2: Copy and verify
+    success, result = copy_with_confirmation(source_key, dest_key, s3_client, max_retries)
+    if not success:
+        return False, result
+    
     # Step 3: Delete original with retries
     retry_count = 0
     while retry_count < max_retries:
@@ -176,6 +248,7 @@ def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
                 Key=source_key
             )
             result['delete_success'] = True
+            _forget_listings(source_key)
             result['retries']['delete'] = retry_count
             logger.info(f"Successfully deleted original: {source_key} (Attempt: {retry_count+1})")
             break
@@ -207,23 +280,150 @@ def move_with_confirmation(source_key, dest_key, s3_client=None, max_retries=3):
     return True, result
 
 
+DELETE_BATCH = 1000  # Most keys S3 accepts in one DeleteObjects request
+MOVE_DELETE_EVERY = 100  # Verified copies move_keys() lets build up before deleting their originals
+
+
+def delete_objects(keys, s3_client=None, max_retries=3):
+    """
+    Delete many objects with batched DeleteObjects requests (up to 1000 keys
+    per request) instead of one DELETE per key.
+    
+    Keys S3 reports in a response's Errors list, and every key of a request
+    that failed outright, are retried with exponential backoff like the
+    single-object helpers above.
+    
+    Args:
+        keys (list): S3 keys to delete
+        s3_client (boto3.client, optional): Initialized S3 client, or None to use default
+        max_retries (int): Maximum number of attempts per key
+        
+    Returns:
+        dict: Key -> last error message for each key still not deleted
+    """
+    if s3_client is None:
+        s3_client = _S3
+    
+    failed = {}
+    for start in range(0, len(keys), DELETE_BATCH):
+        pending = keys[start:start + DELETE_BATCH]
+        retry_count = 0
+        while pending:
+            try:
+                response = s3_client.delete_objects(
+                    Bucket=_BUCKET,
+                    Delete={'Objects': [{'Key': key} for key in pending], 'Quiet': True}
+                )
+                errors = {
+                    error['Key']: f"{error.get('Code')}: {error.get('Message')}"
+                    for error in response.get('Errors', [])
+                }
+            except Exception as e:
+                errors = {key: str(e) for key in pending}
+            if not errors:
+                break
+            
+            retry_count += 1
+            if retry_count >= max_retries:
+                failed.update(errors)
+                break
+            pending = [key for key in pending if key in errors]
+            wait_time = (2 ** retry_count) * 0.1  # Exponential backoff
+            logger.warning(f"Delete attempt {retry_count}/{max_retries} failed for {len(pending)} objects, retrying in {wait_time:.2f}s")
+            time.sleep(wait_time)
+    
+    _forget_listings(*keys)
+    logger.info(f"Deleted {len(keys) - len(failed)} of {len(keys)} objects")
+    if failed:
+        logger.error(f"Failed to delete {len(failed)} objects after {max_retries} attempts: {', '.join(sorted(failed))}")
+    return failed
+
+
+def move_keys(pairs, workers: int = MOVE_WORKERS):
+    """
+    Move many objects: copy and verify each with copy_with_confirmation() on
+    a thread pool, and delete the verified originals with delete_objects()
+    every MOVE_DELETE_EVERY copies, so an interrupted run leaves at most that
+    many objects in both places.
+    
+    A move is logged once its original is deleted. A copy whose original
+    can't be deleted still counts as moved, as in move_with_confirmation(),
+    and is logged as a warning with the delete error.
+    
+    Args:
+        pairs (iterable): (source_key, dest_key) tuples; consumed lazily, so
+            copies start while it is still being produced
+        workers (int): Number of copies running at once
+        
+    Returns:
+        tuple: (moved, failed)
+            - moved (list): (source_key, dest_key) for each verified copy
+            - failed (list): (source_key, error message) for each failed copy
+    """
+    moved = []
+    failed = []
+    copied = []  # verified copies whose originals are still to be deleted
+    
+    def delete_originals():
+        delete_failed = delete_objects([source_key for source_key, _ in copied])
+        for source_key, dest_key in copied:
+            if source_key in delete_failed:
+                logger.warning(f"Copied {source_key} -> {dest_key} but failed to delete the original: {delete_failed[source_key]}")
+            else:
+                logger.info(f"Moved: {source_key} -> {dest_key}")
+        copied.clear()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(copy_with_confirmation, source_key, dest_key): (source_key, dest_key)
+            for source_key, dest_key in pairs
+        }
+        for future in as_completed(futures):
+            source_key, dest_key = futures[future]
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, {'error': str(e)}
+            if success:
+                moved.append((source_key, dest_key))
+                copied.append((source_key, dest_key))
+                if len(copied) >= MOVE_DELETE_EVERY:
+                    delete_originals()
+            else:
+                error = result.get('error') or 'Unknown error'
+                failed.append((source_key, error))
+                logger.error(f"Failed to move {source_key}: {error}")
+    
+    if copied:
+        delete_originals()
+    return moved, failed
+
+
 def get_s3_json(key: str) -> dict:
     """Get JSON data from an S3 object."""
     response = _S3.get_object(Bucket=_BUCKET, Key=key)
     return json.loads(response['Body'].read().decode('utf-8'))
 
 
-def upload_json_to_s3(data: dict, key: str):
-    """Upload JSON data directly to S3 without creating a local file."""
+def upload_json_to_s3(data: dict, key: str, metadata: dict = None):
+    """Upload JSON data directly to S3 without creating a local file.
+
+    metadata, if given, is stored as x-amz-meta-* headers so readers can
+    inspect it without downloading the body.
+    """
     json_str = json.dumps(data, indent=2)
+    extra = {'Metadata': metadata} if metadata else {}
     _S3.put_object(
         Bucket=_BUCKET,
         Key=key,
         Body=json_str.encode('utf-8'),
-        ContentType='application/json'
+        ContentType='application/json',
+        **extra
     )
+    _forget_listings(key)
 
 
 def delete(key: str):
     """Delete an object from S3."""
     _S3.delete_object(Bucket=_BUCKET, Key=key)
+    _forget_listings(key)